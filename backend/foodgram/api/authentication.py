@@ -0,0 +1,37 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+from foodgram.routers import use_primary
+
+from .cache import count_result
+
+CACHE_NAME = 'auth_tokens'
+
+
+def token_cache_key(key):
+    # В ключ кэша попадает хэш, а не сам токен
+    return f'auth:token:{hashlib.sha256(key.encode()).hexdigest()}'
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication с кэшем токен -> пользователь на
+    TOKEN_CACHE_TIMEOUT секунд. Записи удаляются сигналами
+    (api.signals) при удалении токена и изменении пользователя
+    """
+    def authenticate_credentials(self, key):
+        cache_key = token_cache_key(key)
+        user = cache.get(cache_key)
+        count_result(CACHE_NAME, user is not None)
+        if user is not None:
+
+            return user, self.get_model()(key=key, user=user)
+        # Только что выданного токена на реплике еще может не быть
+        with use_primary():
+            user, token = super().authenticate_credentials(key)
+        cache.set(cache_key, user, settings.TOKEN_CACHE_TIMEOUT)
+
+        return user, token
@@ -0,0 +1,65 @@
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def stats_keys(name):
+    return f'stats:{name}:hits', f'stats:{name}:misses'
+
+
+class ResultCounter:
+    """
+    Счетчики попаданий и промахов копятся в памяти процесса и
+    прибавляются к кэшу не чаще раза в CACHE_STATS_FLUSH_SECONDS:
+    запись в кэш на каждый запрос стоила бы дороже самого попадания
+    """
+    def __init__(self):
+        self.pending = Counter()
+        self.flushed = time.monotonic()
+        self.lock = threading.Lock()
+
+    def count(self, key):
+        with self.lock:
+            self.pending[key] += 1
+            due = (
+                time.monotonic() - self.flushed
+                >= settings.CACHE_STATS_FLUSH_SECONDS
+            )
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, Counter()
+            self.flushed = time.monotonic()
+        for key, value in pending.items():
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                if not cache.add(key, value, timeout=None):
+                    cache.incr(key, value)
+
+
+results = ResultCounter()
+
+
+def count_result(name, hit):
+    """Увеличивает счетчик попаданий или промахов кэша name"""
+    results.count(stats_keys(name)[0 if hit else 1])
+
+
+def get_stats(name):
+    """Возвращает (попадания, промахи) кэша name"""
+    results.flush()
+    hits_key, misses_key = stats_keys(name)
+    values = cache.get_many((hits_key, misses_key))
+
+    return values.get(hits_key, 0), values.get(misses_key, 0)
+
+
+def reset_stats(name):
+    results.flush()
+    cache.delete_many(stats_keys(name))
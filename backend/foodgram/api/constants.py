@@ -1 +1,5 @@
 OBJECTS_ON_THE_PAGE = 10
+INGREDIENT_SEARCH_LIMIT = 50
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+RECIPE_CACHE_TIMEOUT = 60 * 60
+BATCH_SIZE_LIMIT = 100
@@ -1,7 +1,7 @@
 from django_filters import rest_framework as filters
-from rest_framework.filters import SearchFilter as BaseSearchFilter
 
 from recipes.models import Recipe, Tag
+from recipes.search import search_recipes
 from users.models import User
 
 
@@ -19,6 +19,7 @@ class RecipeFilter(filters.FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
 
     def filter_is_favorited(self, queryset, name, value):
         if value and not self.request.user.is_anonymous:
@@ -34,10 +35,10 @@ class RecipeFilter(filters.FilterSet):
 
         return queryset
 
+    def filter_search(self, queryset, name, value):
+
+        return search_recipes(queryset, value)
+
     class Meta:
         model = Recipe
         fields = ['tags', 'author']
-
-
-class SearchFilter(BaseSearchFilter):
-    search_param = 'name'
@@ -0,0 +1,233 @@
+import json
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+
+def percentile(values, share):
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет основные маршруты API (список рецептов с фильтрами, '
+        'рецепт, подписки, выгрузка покупок, поиск ингредиентов) и '
+        'выводит перцентили времени ответа и число SQL-запросов. '
+        'Результат можно сохранить как эталон и сравнивать с ним. '
+        'Данные удобно готовить командой seed_data'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--iterations', type=int, default=50,
+            help='Запросов на каждый маршрут'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=5,
+            help='Запросов для прогрева перед замером'
+        )
+        parser.add_argument(
+            '--only', nargs='*', default=(),
+            help='Прогнать только маршруты, содержащие эти строки'
+        )
+        parser.add_argument(
+            '--save', metavar='PATH',
+            help='Сохранить результаты в JSON-файл'
+        )
+        parser.add_argument(
+            '--compare', metavar='PATH',
+            help='Сравнить с сохраненным ранее эталоном'
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=20,
+            help='Допустимый рост p50 относительно эталона, в процентах'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел'
+        )
+
+    def get_user(self):
+        user = User.objects.filter(
+            purchases__isnull=False, follower__isnull=False
+        ).order_by('id').first()
+        if user is None:
+            raise CommandError(
+                'Нужен пользователь с подписками и списком покупок, '
+                'заполните базу командой seed_data'
+            )
+
+        return user
+
+    def get_routes(self):
+        """Маршруты: имя -> (анонимный запрос, функция, возвращающая url)"""
+        # Выбор через генератор с --seed, чтобы запуски были сравнимы
+        recipes = list(
+            Recipe.objects.order_by('id').values_list('id', 'author_id')
+        )
+        recipe_ids = [pk for pk, _ in recipes]
+        author_id = self.random.choice(recipes)[1]
+        tags = list(Tag.objects.order_by('id').values_list('slug', flat=True))
+        tags = self.random.sample(tags, min(len(tags), 2))
+        names = list(
+            Ingredient.objects.order_by('id').values_list('name', flat=True)
+        )
+        prefix = self.random.choice(names)[:2] if names else 'а'
+        pages = max(len(recipe_ids) // 6, 1)
+
+        def detail():
+            return f'/api/recipes/{self.random.choice(recipe_ids)}/'
+
+        def page():
+            number = self.random.randint(1, pages)
+            return f'/api/recipes/?limit=6&page={number}'
+
+        tag_query = '&'.join(f'tags={slug}' for slug in tags)
+
+        return {
+            'recipes list': (False, lambda: '/api/recipes/?limit=6'),
+            'recipes list (anonymous)': (
+                True, lambda: '/api/recipes/?limit=6'
+            ),
+            'recipes list random page': (False, page),
+            'recipes list ?tags': (
+                False, lambda: f'/api/recipes/?limit=6&{tag_query}'
+            ),
+            'recipes list ?author': (
+                False, lambda: f'/api/recipes/?limit=6&author={author_id}'
+            ),
+            'recipes list ?is_favorited': (
+                False, lambda: '/api/recipes/?limit=6&is_favorited=1'
+            ),
+            'recipes list ?is_in_shopping_cart': (
+                False, lambda: '/api/recipes/?limit=6&is_in_shopping_cart=1'
+            ),
+            'recipes list ?search': (
+                False, lambda: f'/api/recipes/?limit=6&search={prefix}'
+            ),
+            'recipe detail': (False, detail),
+            'subscriptions': (
+                False, lambda: '/api/users/subscriptions/?limit=6'
+            ),
+            'download shopping cart': (
+                False, lambda: '/api/recipes/download_shopping_cart/'
+            ),
+            'ingredients ?name': (
+                True, lambda: f'/api/ingredients/?name={prefix}'
+            ),
+        }
+
+    def request(self, client, url):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.get(url)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - started
+        if response.status_code != 200:
+            raise CommandError(f'{url}: ответ {response.status_code}')
+
+        return elapsed * 1000, len(queries)
+
+    def measure(self, client, make_url, options):
+        for _ in range(options['warmup']):
+            self.request(client, make_url())
+        timings = []
+        query_counts = []
+        for _ in range(options['iterations']):
+            elapsed, queries = self.request(client, make_url())
+            timings.append(elapsed)
+            query_counts.append(queries)
+        timings.sort()
+
+        return {
+            'p50': round(percentile(timings, 0.5), 2),
+            'p95': round(percentile(timings, 0.95), 2),
+            'p99': round(percentile(timings, 0.99), 2),
+            'mean': round(statistics.mean(timings), 2),
+            'queries': max(query_counts),
+        }
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        user = self.get_user()
+        token, _ = Token.objects.get_or_create(user=user)
+        clients = {
+            False: Client(HTTP_AUTHORIZATION=f'Token {token.key}'),
+            True: Client(),
+        }
+        results = {}
+        self.stdout.write(
+            f'{"маршрут":<36}{"p50":>9}{"p95":>9}{"p99":>9}{"SQL":>6}'
+        )
+        for name, (anonymous, make_url) in self.get_routes().items():
+            if options['only'] and not any(
+                part in name for part in options['only']
+            ):
+                continue
+            result = self.measure(clients[anonymous], make_url, options)
+            results[name] = result
+            self.stdout.write(
+                f'{name:<36}{result["p50"]:>9.1f}{result["p95"]:>9.1f}'
+                f'{result["p99"]:>9.1f}{result["queries"]:>6}'
+            )
+        report = {
+            'created': timezone.now().isoformat(),
+            'dataset': {
+                'users': User.objects.count(),
+                'recipes': Recipe.objects.count(),
+                'ingredients': Ingredient.objects.count(),
+            },
+            'iterations': options['iterations'],
+            'routes': results,
+        }
+        if options['save']:
+            with open(options['save'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты сохранены в {options["save"]}')
+        if options['compare']:
+            self.compare(report, options['compare'], options['tolerance'])
+
+    def compare(self, report, path, tolerance):
+        try:
+            with open(path, encoding='utf-8') as file:
+                baseline = json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'Не удалось прочитать эталон {path}: {error}')
+        self.stdout.write(
+            f'\nСравнение с {path} (эталон от {baseline.get("created")}, '
+            f'данные {baseline.get("dataset")})'
+        )
+        regressions = []
+        for name, result in report['routes'].items():
+            before = baseline['routes'].get(name)
+            if before is None:
+                self.stdout.write(f'{name}: нет в эталоне')
+                continue
+            change = (
+                (result['p50'] - before['p50']) / before['p50'] * 100
+                if before['p50'] else 0
+            )
+            line = (
+                f'{name:<36}p50 {before["p50"]:.1f} -> {result["p50"]:.1f} '
+                f'({change:+.0f}%), SQL {before["queries"]} -> '
+                f'{result["queries"]}'
+            )
+            if change > tolerance or result['queries'] > before['queries']:
+                regressions.append(name)
+                line = self.style.ERROR(line)
+            self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                f'Ухудшение относительно эталона: {", ".join(regressions)}'
+            )
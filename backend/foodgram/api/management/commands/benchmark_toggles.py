@@ -0,0 +1,141 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import AsyncClient, Client
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Recipe
+from users.models import User
+
+BENCHMARK_USER = 'toggle_benchmark_{}'
+MODES = ('wsgi', 'asgi')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность добавления и удаления '
+        'избранного через обработчики WSGI (потоки) и ASGI (event loop, '
+        'view в пуле потоков) при параллельных запросах. '
+        'Работает с локальной базой: '
+        'создает временных пользователей и удаляет их в конце'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на каждый режим'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=20,
+            help='Число одновременных запросов'
+        )
+        parser.add_argument(
+            '--mode', choices=MODES,
+            help='Прогнать только один режим'
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        for mode in [options['mode']] if options['mode'] else MODES:
+            results[mode] = self.run_mode(mode, options)
+            self.report(mode, results[mode])
+        if len(results) == len(MODES) and results['wsgi']['rps']:
+            self.stdout.write(
+                'ASGI / WSGI: '
+                f'{results["asgi"]["rps"] / results["wsgi"]["rps"]:.2f}x'
+            )
+
+    def report(self, mode, result):
+        self.stdout.write(
+            f'{mode}: {result["rps"]:.1f} запр/с, '
+            f'p50 {result["p50"]:.1f} мс, p95 {result["p95"]:.1f} мс, '
+            f'ошибок {result["errors"]} из {result["requests"]}'
+        )
+
+    def prepare(self, concurrency):
+        recipe = Recipe.objects.order_by('id').first()
+        if recipe is None:
+            raise CommandError('В базе нет рецептов')
+        tokens = []
+        for number in range(concurrency):
+            user, _ = User.objects.get_or_create(
+                username=BENCHMARK_USER.format(number),
+                defaults={
+                    'email': f'{BENCHMARK_USER.format(number)}@example.com',
+                    'first_name': 'Benchmark', 'last_name': 'User',
+                }
+            )
+            tokens.append(Token.objects.get_or_create(user=user)[0].key)
+
+        return f'/api/recipes/{recipe.id}/favorite/', tokens
+
+    def run_mode(self, mode, options):
+        concurrency = options['concurrency']
+        url, tokens = self.prepare(concurrency)
+        per_worker = max(options['requests'] // concurrency, 1)
+        try:
+            started = time.perf_counter()
+            if mode == 'asgi':
+                timings = asyncio.run(
+                    self.run_async(url, tokens, per_worker)
+                )
+            else:
+                with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                    timings = pool.map(
+                        lambda token: self.run_sync(url, token, per_worker),
+                        tokens
+                    )
+                    timings = [item for items in timings for item in items]
+            elapsed = time.perf_counter() - started
+        finally:
+            User.objects.filter(
+                username__startswith=BENCHMARK_USER.format('')
+            ).delete()
+        latencies = sorted(duration for duration, _ in timings)
+
+        return {
+            'requests': len(timings),
+            'errors': sum(not ok for _, ok in timings),
+            'rps': len(timings) / elapsed,
+            'p50': statistics.median(latencies) * 1000,
+            'p95': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        }
+
+    def run_sync(self, url, token, count):
+        client = Client(
+            HTTP_AUTHORIZATION=f'Token {token}', raise_request_exception=False
+        )
+        timings = []
+        for number in range(count):
+            method = client.post if number % 2 == 0 else client.delete
+            started = time.perf_counter()
+            response = method(url)
+            timings.append((
+                time.perf_counter() - started, response.status_code < 400
+            ))
+
+        return timings
+
+    async def run_async(self, url, tokens, count):
+        async def worker(token):
+            # AsyncClient передает заголовки именованными аргументами
+            # запроса, а не через defaults
+            client = AsyncClient(raise_request_exception=False)
+            timings = []
+            for number in range(count):
+                method = client.post if number % 2 == 0 else client.delete
+                started = time.perf_counter()
+                response = await method(url, authorization=f'Token {token}')
+                timings.append((
+                    time.perf_counter() - started,
+                    response.status_code < 400
+                ))
+
+            return timings
+
+        results = await asyncio.gather(*(worker(token) for token in tokens))
+
+        return [item for items in results for item in items]
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает счетчики попаданий и промахов кэшей'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'names', nargs='*', default=['recipes', 'auth_tokens'],
+            help='Имена кэшей (по умолчанию recipes и auth_tokens)'
+        )
+        parser.add_argument(
+            '--reset', action='store_true',
+            help='Обнулить счетчики после вывода'
+        )
+
+    def handle(self, *args, **options):
+        for name in options['names']:
+            hits, misses = get_stats(name)
+            total = hits + misses
+            ratio = hits / total * 100 if total else 0
+            self.stdout.write(
+                f'{name}: попаданий {hits}, промахов {misses} ({ratio:.1f}%)'
+            )
+            if options['reset']:
+                reset_stats(name)
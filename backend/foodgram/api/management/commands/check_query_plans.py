@@ -0,0 +1,128 @@
+import json
+
+from django.contrib import admin
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredient, ShoppingCartTotal
+)
+from recipes.search import search_recipes
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Прогоняет основные запросы API через EXPLAIN (PostgreSQL) и '
+        'завершается с ошибкой, если в плане есть Seq Scan по таблице '
+        'больше порога. Запускать на заполненной базе'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=int, default=1000,
+            help='Число строк, начиная с которого Seq Scan считается ошибкой'
+        )
+
+    def admin_search(self, model, term):
+        """Поиск из списка объектов в админке, как его строит changelist"""
+        request = RequestFactory().get('/admin/', {'q': term})
+        model_admin = admin.site._registry[model]
+        queryset, _ = model_admin.get_search_results(
+            request, model_admin.get_queryset(request), term
+        )
+
+        return queryset[:100]
+
+    def get_queries(self, user):
+        recipes = Recipe.objects.with_user_flags(user)
+        name = Ingredient.objects.values_list('name', flat=True).first()
+        recipe_name = Recipe.objects.values_list('name', flat=True).first()
+
+        return {
+            'recipes list': recipes.order_by('-pub_date', '-id')[:10],
+            'recipes list ?author': recipes.filter(
+                author=user
+            ).order_by('-pub_date')[:10],
+            'recipes list ?is_favorited': recipes.filter(
+                favorited_by__user=user
+            ).order_by('-pub_date')[:10],
+            'recipes list ?is_in_shopping_cart': recipes.filter(
+                customers__user=user
+            ).order_by('-pub_date')[:10],
+            'recipes list ?search': search_recipes(recipes, 'суп')[:10],
+            'recipes detail': recipes.filter(pk=1),
+            'recipes detail ingredients': RecipeIngredient.objects.filter(
+                recipe_id=1
+            ).select_related('ingredient'),
+            'subscriptions': User.objects.filter(
+                following__user=user
+            ).order_by('username', 'id')[:10],
+            'download_shopping_cart': ShoppingCartTotal.objects.filter(
+                user=user
+            ).select_related('ingredient'),
+            'admin ingredients search': self.admin_search(
+                Ingredient, (name or 'а')[:2]
+            ),
+            'admin recipes ^name': Recipe.objects.filter(
+                name__istartswith=(recipe_name or 'а')[:2]
+            )[:100],
+            # Поиск пользователей в админке объединяет через OR еще и
+            # first_name/last_name по вхождению, которым индекс не
+            # поможет, поэтому проверяются поля с поиском по началу (^)
+            'admin users ^username': User.objects.filter(
+                username__istartswith=user.username[:2]
+            )[:100],
+            'admin users ^email': User.objects.filter(
+                email__istartswith=user.email[:2]
+            )[:100],
+        }
+
+    def seq_scans(self, plan):
+        if plan.get('Node Type') == 'Seq Scan':
+            yield plan['Relation Name']
+        for child in plan.get('Plans', ()):
+            yield from self.seq_scans(child)
+
+    def table_size(self, cursor, table, sizes):
+        if table not in sizes:
+            cursor.execute(
+                f'SELECT count(*) FROM {connection.ops.quote_name(table)}'
+            )
+            sizes[table] = cursor.fetchone()[0]
+
+        return sizes[table]
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов работает только с PostgreSQL')
+        user = User.objects.order_by('id').first()
+        if user is None:
+            raise CommandError('База пуста, сначала заполните ее данными')
+        failures = []
+        sizes = {}
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+            for name, queryset in self.get_queries(user).items():
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                scans = [
+                    table for table in self.seq_scans(plan[0]['Plan'])
+                    if self.table_size(cursor, table, sizes)
+                    >= options['threshold']
+                ]
+                if scans:
+                    failures.append(name)
+                    self.stdout.write(self.style.ERROR(
+                        f'{name}: Seq Scan по {", ".join(scans)}'
+                    ))
+                else:
+                    self.stdout.write(f'{name}: OK')
+        if failures:
+            raise CommandError(
+                f'Полный просмотр больших таблиц в запросах: {len(failures)}'
+            )
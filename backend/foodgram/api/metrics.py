@@ -0,0 +1,85 @@
+import re
+from contextvars import ContextVar
+from time import perf_counter
+
+# Метрики текущего запроса. ContextVar передается и в потоки
+# sync_to_async, поэтому запросы под ASGI тоже учитываются
+current_metrics = ContextVar('current_metrics', default=None)
+
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+NUMBER = re.compile(r'\b\d+\b')
+
+
+class RequestMetrics:
+    """Счетчики одного HTTP-запроса: SQL, сериализация, view"""
+    __slots__ = (
+        'started', 'view_started', 'queries', 'db_time',
+        'statements', 'serializer_time', 'serializer_depth',
+    )
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.view_started = None
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = {}
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def repeated_queries(self, limit=5):
+        """
+        Самые частые запросы, встретившиеся больше одного раза.
+        Списки IN и числа в SQL сворачиваются, чтобы запросы
+        N+1 с разными параметрами попали в одну группу
+        """
+        counts = {}
+        for sql, count in self.statements.items():
+            sql = NUMBER.sub('N', IN_LIST.sub('IN (...)', sql))
+            counts[sql] = counts.get(sql, 0) + count
+        repeated = sorted(
+            ((count, sql) for sql, count in counts.items() if count > 1),
+            reverse=True
+        )
+
+        return repeated[:limit]
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Обертка execute_wrapper, ставится на каждое соединение
+    при его создании (см. ApiConfig.ready)
+    """
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db_time += perf_counter() - started
+        metrics.queries += 1
+        metrics.statements[sql] = metrics.statements.get(sql, 0) + 1
+
+
+def install_query_recorder(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedSerializerMixin:
+    """
+    Учитывает время сериализации в метриках запроса.
+    Считается только внешний вызов, вложенные сериализаторы
+    входят в его время
+    """
+    def to_representation(self, instance):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.serializer_depth:
+            return super().to_representation(instance)
+        metrics.serializer_depth += 1
+        started = perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_depth -= 1
+            metrics.serializer_time += perf_counter() - started
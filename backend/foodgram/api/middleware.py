@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+from time import perf_counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+from foodgram.routers import reading_from_replica, replica_aliases
+
+from .metrics import RequestMetrics, current_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class ServerTimingMiddleware(MiddlewareMixin):
+    """
+    Считает для каждого запроса число SQL-запросов, время в базе,
+    время сериализации, view и общее время. Отдает их в заголовке
+    Server-Timing сотрудникам (или всем при SERVER_TIMING) и пишет
+    в лог запросы дольше SLOW_REQUEST_MS или с числом SQL-запросов
+    больше SLOW_REQUEST_QUERIES. Должен стоять первым в MIDDLEWARE
+    """
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        token = current_metrics.set(RequestMetrics())
+        try:
+            response = self.get_response(request)
+            return self.finish(request, response)
+        finally:
+            current_metrics.reset(token)
+
+    async def __acall__(self, request):
+        token = current_metrics.set(RequestMetrics())
+        try:
+            response = await self.get_response(request)
+            return self.finish(request, response)
+        finally:
+            current_metrics.reset(token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        current_metrics.get().view_started = perf_counter()
+
+    def finish(self, request, response):
+        metrics = current_metrics.get()
+        finished = perf_counter()
+        total = (finished - metrics.started) * 1000
+        view = (
+            (finished - metrics.view_started) * 1000
+            if metrics.view_started else 0
+        )
+        db = metrics.db_time * 1000
+        user = getattr(request, 'user', None)
+        if settings.SERVER_TIMING or (user is not None and user.is_staff):
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={db:.1f};desc="{metrics.queries} queries"',
+                f'serializer;dur={metrics.serializer_time * 1000:.1f}',
+                f'view;dur={view:.1f}',
+                f'total;dur={total:.1f}',
+            ))
+        if (total > settings.SLOW_REQUEST_MS
+                or metrics.queries > settings.SLOW_REQUEST_QUERIES):
+            match = request.resolver_match
+            repeated = '; '.join(
+                f'{count}x {sql}' for count, sql in metrics.repeated_queries()
+            )
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, view %.0f мс, '
+                'SQL %d за %.0f мс, сериализация %.0f мс. '
+                'Повторяющиеся запросы: %s',
+                request.method, request.path,
+                match.view_name if match else '-', total, view,
+                metrics.queries, db, metrics.serializer_time * 1000,
+                repeated or 'нет'
+            )
+
+        return response
+
+
+class ReplicaRoutingMiddleware(MiddlewareMixin):
+    """
+    Разрешает безопасным запросам читать с реплик (foodgram.routers).
+    После успешной записи запросы того же клиента (по токену или
+    сессии) REPLICA_STICKY_SECONDS читают основную базу, чтобы
+    новые данные были видны сразу
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.enabled = bool(replica_aliases())
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        token = reading_from_replica.set(self.can_use_replica(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            reading_from_replica.reset(token)
+
+        return self.remember_write(request, response)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        token = reading_from_replica.set(self.can_use_replica(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            reading_from_replica.reset(token)
+
+        return self.remember_write(request, response)
+
+    def sticky_key(self, request):
+        client = (
+            request.META.get('HTTP_AUTHORIZATION')
+            or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+        )
+        if not client:
+            return None
+
+        return f'replica:sticky:{hashlib.sha256(client.encode()).hexdigest()}'
+
+    def can_use_replica(self, request):
+        if request.method not in SAFE_METHODS:
+            return False
+        key = self.sticky_key(request)
+
+        return key is None or cache.get(key) is None
+
+    def remember_write(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            key = self.sticky_key(request)
+            if key is not None:
+                cache.set(key, True, settings.REPLICA_STICKY_SECONDS)
+
+        return response
@@ -0,0 +1,126 @@
+import hashlib
+
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.utils.http import urlencode
+from rest_framework.renderers import JSONRenderer
+
+from foodgram.routers import use_primary
+from recipes.versions import get_version
+from .cache import count_result
+from .constants import RECIPE_CACHE_TIMEOUT, REFERENCE_CACHE_TIMEOUT
+
+
+class ReferenceDataMixin:
+    """
+    Для справочников: ETag и Last-Modified по версии данных,
+    ответ 304 на повторный запрос и кэш полного списка
+    """
+    version_name = None
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, self.render_list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            request, super().retrieve, *args, **kwargs
+        )
+
+    def conditional_response(self, request, build, *args, **kwargs):
+        version, modified = get_version(self.version_name)
+        etag = quote_etag(f'{self.version_name}-{version}')
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified
+        )
+        if response is None:
+            self.version = version
+            response = build(request, *args, **kwargs)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        patch_cache_control(response, no_cache=True)
+
+        return response
+
+    def is_full_list(self, request):
+        return not request.query_params
+
+    def render_list(self, request, *args, **kwargs):
+        if not self.is_full_list(request):
+            return super().list(request, *args, **kwargs)
+        key = f'{self.version_name}:list:{self.version}'
+        content = cache.get(key)
+        if content is None:
+            with use_primary():
+                serializer = self.get_serializer(
+                    self.get_queryset(), many=True
+                )
+                content = JSONRenderer().render(serializer.data)
+            cache.set(key, content, REFERENCE_CACHE_TIMEOUT)
+
+        return HttpResponse(content, content_type='application/json')
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширует ответы list и retrieve для анонимных пользователей.
+    Ключ включает версии данных из list_versions / detail_versions
+    (их увеличивают сигналы в recipes.signals) и нормализованную
+    строку запроса, поэтому изменения сбрасывают только свои записи
+    """
+    cache_name = None
+    list_versions = ()
+    detail_versions = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, self.list_versions, super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, self.detail_versions, super().retrieve, *args, **kwargs
+        )
+
+    def is_cacheable(self, request):
+        return (request.user.is_anonymous
+                and request.accepted_renderer.format == 'json')
+
+    def get_cache_key(self, request, versions, kwargs):
+        versions = ':'.join(
+            str(get_version(name.format(**kwargs))[0]) for name in versions
+        )
+        query = urlencode(sorted(
+            (key, sorted(values))
+            for key, values in request.query_params.lists()
+        ), doseq=True)
+        digest = hashlib.md5(
+            f'{request.get_host()}?{query}'.encode()
+        ).hexdigest()
+
+        return f'{self.cache_name}:{self.action}:{versions}:{digest}'
+
+    def cached_response(self, request, versions, build, *args, **kwargs):
+        if not self.is_cacheable(request):
+            return build(request, *args, **kwargs)
+        key = self.get_cache_key(request, versions, kwargs)
+        content = cache.get(key)
+        count_result(self.cache_name, content is not None)
+        if content is not None:
+            response = HttpResponse(content, content_type='application/json')
+            response['X-Cache'] = 'HIT'
+
+            return response
+        # Ответ кэшируется под новой версией, поэтому без реплик
+        with use_primary():
+            response = build(request, *args, **kwargs)
+        if response.status_code == 200:
+            content = JSONRenderer().render(response.data)
+            cache.set(key, content, RECIPE_CACHE_TIMEOUT)
+            response = HttpResponse(content, content_type='application/json')
+        response['X-Cache'] = 'MISS'
+
+        return response
@@ -1,5 +1,177 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from foodgram.paginators import EstimatedCountPaginator
+
+from .constants import OBJECTS_ON_THE_PAGE
+
+
+class KeysetPaginator(BasePagination):
+    """
+    Курсорная пагинация по ключу из полей ordering.
+    Курсор непрозрачный: base64 от направления и ключа крайней строки
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = OBJECTS_ON_THE_PAGE
+    ordering = ('-pub_date', '-id')
+
+    def __init__(self, ordering=None, page_size=None):
+        if ordering is not None:
+            self.ordering = ordering
+        if page_size is not None:
+            self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        direction, position = self.decode_cursor(request, queryset.model)
+        backwards = direction == 'previous'
+        ordering = self.ordering
+        if backwards:
+            ordering = [self.reverse(field) for field in ordering]
+        if position is not None:
+            queryset = queryset.filter(self.after(ordering, position))
+        rows = list(queryset.order_by(*ordering)[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if backwards:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = position is not None
+        self.page = rows
+
+        return rows
+
+    def get_paginated_response(self, data):
+
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+
+        return page_size if page_size > 0 else self.page_size
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+
+        return self.encode_cursor('next', self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+
+        return self.encode_cursor('previous', self.page[0])
+
+    def encode_cursor(self, direction, obj):
+        position = [
+            str(getattr(obj, field.lstrip('-'))) for field in self.ordering
+        ]
+        cursor = base64.urlsafe_b64encode(
+            json.dumps([direction, position]).encode()
+        ).decode()
+        url = self.request.build_absolute_uri()
+
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return 'next', None
+        try:
+            direction, position = json.loads(
+                base64.urlsafe_b64decode(cursor.encode())
+            )
+            if (direction not in ('next', 'previous')
+                    or len(position) != len(self.ordering)):
+                raise ValueError
+            position = [
+                model._meta.get_field(field.lstrip('-')).to_python(value)
+                for field, value in zip(self.ordering, position)
+            ]
+        except (TypeError, ValueError, binascii.Error,
+                DjangoValidationError):
+            raise NotFound('Неверный курсор')
+
+        return direction, position
+
+    @staticmethod
+    def reverse(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def after(ordering, position):
+        """Условие «строка идет после position» для заданного ordering"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+
+        return condition
 
 
 class PageNumberPaginatorModified(PageNumberPagination):
+    """
+    Постраничная пагинация. С параметром ?cursor= (для первой страницы
+    значение можно оставить пустым) переключается на курсорную по ordering.
+    Параметры из ordered_params задают свою сортировку (search - по
+    релевантности), с курсором их использовать нельзя
+    """
     page_size_query_param = 'limit'
+    django_paginator_class = EstimatedCountPaginator
+    ordering = ('-pub_date', '-id')
+    ordered_params = ('search',)
+    cursor_paginator = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPaginator.cursor_query_param in request.query_params:
+            conflicting = [
+                param for param in self.ordered_params
+                if request.query_params.get(param)
+            ]
+            if conflicting:
+                raise ValidationError({
+                    param: 'Нельзя использовать вместе с cursor'
+                    for param in conflicting
+                })
+            self.cursor_paginator = KeysetPaginator(
+                self.ordering, self.page_size or OBJECTS_ON_THE_PAGE
+            )
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+
+class SubscriptionsPaginator(PageNumberPaginatorModified):
+    page_size = OBJECTS_ON_THE_PAGE
+    ordering = ('username', 'id')
@@ -0,0 +1,74 @@
+import csv
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class Echo:
+    """Буфер для csv.writer, возвращающий записанную строку"""
+    def write(self, value):
+        return value
+
+
+class ShoppingCartRenderer(BaseRenderer):
+    """
+    Базовый рендерер списка покупок. Строки отдаются по одной
+    через stream(), чтобы ответ можно было передавать потоком
+    """
+    charset = 'utf-8'
+
+    @property
+    def filename(self):
+        return f'cart.{self.format}'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+
+            return str(data.get('detail', data)).encode(self.charset)
+
+        return ''.join(self.stream(data)).encode(self.charset)
+
+    def stream(self, rows):
+        raise NotImplementedError
+
+
+class ShoppingCartTextRenderer(ShoppingCartRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, rows):
+        for row in rows:
+            yield (f'{row["name"]} ({row["measurement_unit"]}) — '
+                   f'{row["amount"]} \n')
+
+
+class ShoppingCartCSVRenderer(ShoppingCartRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, rows):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('id', 'name', 'measurement_unit', 'amount'))
+        for row in rows:
+            yield writer.writerow((
+                row['id'], row['name'], row['measurement_unit'], row['amount']
+            ))
+
+
+class ShoppingCartJSONRenderer(ShoppingCartRenderer):
+    media_type = 'application/json'
+    format = 'json'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+
+            return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+        return super().render(data, accepted_media_type, renderer_context)
+
+    def stream(self, rows):
+        separator = '['
+        for row in rows:
+            yield separator + json.dumps(row, ensure_ascii=False)
+            separator = ','
+        yield '[]' if separator == '[' else ']'
@@ -1,17 +1,24 @@
+from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from django.forms import ValidationError
 from djoser.serializers import UserSerializer as BaseUserSerializer
 from drf_extra_fields.fields import Base64ImageField
 from rest_framework import serializers
-from rest_framework.generics import get_object_or_404
 
 from users.models import User, Subscribe
+from recipes.images import SOURCE_KEY
 from recipes.models import (
     Favorite, Ingredient, Recipe,
-    RecipeIngredient, ShoppingList, Tag
+    RecipeIngredient, ShoppingCartTotal, ShoppingList, Tag
 )
+from recipes.signals import bump_on_commit
 
+from .constants import BATCH_SIZE_LIMIT
+from .metrics import TimedSerializerMixin
+from .sql import delete_returning
 
-class UserSerializer(BaseUserSerializer):
+
+class UserSerializer(TimedSerializerMixin, BaseUserSerializer):
     class Meta:
         model = User
         fields = (
@@ -20,7 +27,30 @@ class UserSerializer(BaseUserSerializer):
         )
 
 
-class UserShowSerializer(serializers.ModelSerializer):
+class SubscribedMixin:
+    """
+    Вычисляет is_subscribed по множеству авторов, на которых подписан
+    пользователь. Множество загружается один раз за запрос
+    """
+    def get_is_subscribed(self, obj):
+        request = self.context.get('request')
+        if not request or request.user.is_anonymous:
+
+            return False
+
+        if not hasattr(request, 'subscribed_authors'):
+            request.subscribed_authors = set(
+                Subscribe.objects.filter(
+                    user=request.user
+                ).values_list('author_id', flat=True)
+            )
+
+        return obj.id in request.subscribed_authors
+
+
+class UserShowSerializer(
+    TimedSerializerMixin, SubscribedMixin, serializers.ModelSerializer
+):
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -30,28 +60,22 @@ class UserShowSerializer(serializers.ModelSerializer):
             'last_name', 'is_subscribed',
         )
 
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
-
-            return False
 
-        return Subscribe.objects.filter(user=request.user, author=obj).exists()
-
-
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
 
 
-class ShowRecipeIngredientSerializer(serializers.ModelSerializer):
+class ShowRecipeIngredientSerializer(
+    TimedSerializerMixin, serializers.ModelSerializer
+):
     id = serializers.ReadOnlyField(source='ingredient.id')
     name = serializers.ReadOnlyField(source='ingredient.name')
     measurement_unit = serializers.ReadOnlyField(
@@ -84,18 +108,28 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
         read_only_fields = ('author',)
 
+    def validate_ingredients(self, ingredients):
+        ids = [ingredient['id'] for ingredient in ingredients]
+        found = Ingredient.objects.in_bulk(ids)
+        missing = sorted({pk for pk in ids if pk not in found})
+        if missing:
+            raise serializers.ValidationError(
+                f'Ингредиенты не найдены: {", ".join(map(str, missing))}'
+            )
+
+        return ingredients
+
     def create_ingredient(self, recipe, ingredients):
-        for ingredient in ingredients:
-            obj = get_object_or_404(Ingredient, id=ingredient['id'])
-            amount = ingredient['amount']
-            RecipeIngredient.objects.bulk_create(
-                [RecipeIngredient(
-                    recipe=recipe,
-                    ingredient=obj,
-                    amount=amount,
-                )]
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient['id'],
+                amount=ingredient['amount'],
             )
+            for ingredient in ingredients
+        ])
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         image = validated_data.pop('image')
@@ -105,38 +139,84 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
             **validated_data
         )
         recipe.tags.set(tags)
-        ingredients = self.initial_data.get('ingredients')
         self.create_ingredient(recipe, ingredients)
 
         return recipe
 
+    def update_ingredient(self, recipe, ingredients):
+        """
+        Приводит ингредиенты рецепта к переданным, изменяя только
+        отличающиеся строки. Возвращает изменения количеств
+        {id ингредиента: разница}
+        """
+        current = {
+            item.ingredient_id: item
+            for item in RecipeIngredient.objects.filter(recipe=recipe)
+        }
+        submitted = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        deltas = {pk: -item.amount for pk, item in current.items()}
+        for pk, amount in submitted.items():
+            deltas[pk] = deltas.get(pk, 0) + amount
+
+        removed = [
+            item.id for pk, item in current.items() if pk not in submitted
+        ]
+        if removed:
+            delete_returning(RecipeIngredient.objects.filter(id__in=removed))
+        changed = []
+        for pk, amount in submitted.items():
+            if pk in current and current[pk].amount != amount:
+                current[pk].amount = amount
+                changed.append(current[pk])
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        self.create_ingredient(recipe, [
+            ingredient for ingredient in ingredients
+            if ingredient['id'] not in current
+        ])
+
+        return deltas
+
+    @transaction.atomic
     def update(self, instance, validated_data):
+        Recipe.objects.select_for_update().only('id').get(pk=instance.pk)
         if 'ingredients' in self.initial_data:
-            ingredients = validated_data.pop('ingredients')
-
-            for ingredient in ingredients:
-                if ingredient['amount'] < 0:
-                    raise serializers.ValidationError(
-                        'Количество ингредиента не может быть меньше 1'
-                    )
-            instance.ingredients.clear()
-            ingredients = self.initial_data.get('ingredients')
-            self.create_ingredient(instance, ingredients)
+            deltas = self.update_ingredient(
+                instance, validated_data.pop('ingredients')
+            )
+            ShoppingCartTotal.objects.apply(
+                instance.customers.values_list('user_id', flat=True),
+                deltas
+            )
+            # bulk_create и bulk_update не отправляют сигналов
+            bump_on_commit('recipes', f'recipe:{instance.pk}')
         if 'tags' in self.initial_data:
             tags = validated_data.pop('tags')
             instance.tags.set(tags)
 
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time
-        )
-        instance.image = validated_data.get('image', instance.image)
-        instance.save()
+        fields = [
+            field for field in ('name', 'text', 'cooking_time', 'image')
+            if field in validated_data
+        ]
+        for field in fields:
+            setattr(instance, field, validated_data[field])
+        if fields:
+            instance.save(update_fields=fields)
 
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        )
 
         return RecipeListSerializer(
             instance,
@@ -144,7 +224,7 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         ).data
 
     def validate(self, data):
-        ingredients = self.initial_data.get('ingredients')
+        ingredients = self.initial_data.get('ingredients', [])
         ingredients_list = {}
         for ingredient in ingredients:
             if ingredient.get('id') in ingredients_list:
@@ -162,27 +242,46 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         return data
 
 
-class RecipeListSerializer(serializers.ModelSerializer):
+class ImageVariantsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии изображения рецепта"""
+    def to_representation(self, value):
+        request = self.context.get('request')
+        storage = Recipe._meta.get_field('image').storage
+        urls = {}
+        for name, path in value.items():
+            if name == SOURCE_KEY:
+                continue
+            url = storage.url(path)
+            urls[name] = request.build_absolute_uri(url) if request else url
+
+        return urls
+
+
+class RecipeListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     author = UserShowSerializer()
     tags = TagSerializer(many=True)
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image',
+            'is_in_shopping_cart', 'name', 'image', 'image_variants',
             'text', 'cooking_time',
         )
 
     def get_ingredients(self, obj):
-        qs = RecipeIngredient.objects.filter(recipe=obj)
 
-        return ShowRecipeIngredientSerializer(qs, many=True).data
+        return ShowRecipeIngredientSerializer(
+            obj.recipeingredient_set.all(), many=True
+        ).data
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
 
@@ -191,6 +290,8 @@ class RecipeListSerializer(serializers.ModelSerializer):
         return Favorite.objects.filter(user=request.user, recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if not request or request.user.is_anonymous:
 
@@ -202,65 +303,19 @@ class RecipeListSerializer(serializers.ModelSerializer):
         ).exists()
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time',)
-
+class RecipeShortSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    image_variants = ImageVariantsField()
 
-class FavoriteSerializer(serializers.ModelSerializer):
     class Meta:
-        model = Favorite
-        fields = ('recipe', 'user',)
-
-    def validate(self, attrs):
-        request = self.context['request']
-        if (request.method == 'GET' and Favorite.objects.filter(
-            user=request.user,
-            recipe=attrs['recipe']
-        ).exists()):
-            raise serializers.ValidationError(
-                'Рецепт уже добавлен в избранное'
-            )
-
-        return attrs
-
-    def to_representation(self, instance):
-
-        return RecipeShortSerializer(
-            instance.recipe,
-            context={'request': self.context.get('request')}
-        ).data
-
-
-class ShoppingListSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = ShoppingList
-        fields = ('id', 'user', 'recipe', 'created_at',)
-
-    def validate(self, attrs):
-        request = self.context['request']
-        if (request.method == 'GET' and ShoppingList.objects.filter(
-            user=request.user,
-            recipe=attrs['recipe']
-        )):
-            raise serializers.ValidationError(
-                'Рецепт уже добавлен в список покупок'
-            )
-
-        return attrs
-
-    def to_representation(self, instance):
-
-        return RecipeShortSerializer(
-            instance.recipe,
-            context={'request': self.context.get('request')}
-        ).data
+        model = Recipe
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time',)
 
 
-class SubscribersSerializer(serializers.ModelSerializer):
-    recipes = RecipeShortSerializer(many=True, read_only=True)
-    recipes_count = serializers.SerializerMethodField()
+class SubscribersSerializer(
+    TimedSerializerMixin, SubscribedMixin, serializers.ModelSerializer
+):
+    recipes = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
     is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
@@ -270,42 +325,48 @@ class SubscribersSerializer(serializers.ModelSerializer):
             'is_subscribed', 'recipes', 'recipes_count'
         )
 
-    def get_recipes_count(self, obj):
-
-        return obj.recipes.count()
+    @staticmethod
+    def get_recipes_limit(request):
+        """Значение ?recipes_limit= или None, если оно не задано"""
+        try:
+            limit = int(request.query_params['recipes_limit'])
+        except (AttributeError, KeyError, ValueError):
+            return None
 
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        if not request or request.user.is_anonymous:
+        return limit if limit >= 0 else None
 
-            return False
+    def get_recipes(self, obj):
+        recipes = getattr(obj, 'recent_recipes', None)
+        if recipes is None:
+            recipes = obj.recipes.all()
+            limit = self.get_recipes_limit(self.context.get('request'))
+            if limit is not None:
+                recipes = recipes[:limit]
 
-        return Subscribe.objects.filter(user=obj, author=request.user).exists()
+        return RecipeShortSerializer(
+            recipes, many=True, context=self.context
+        ).data
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Subscribe
-        fields = ('user', 'author',)
+class BatchSerializer(serializers.Serializer):
+    """Списки id для пакетного добавления и удаления"""
+    add = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        default=list,
+        max_length=BATCH_SIZE_LIMIT
+    )
+    remove = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        default=list,
+        max_length=BATCH_SIZE_LIMIT
+    )
 
     def validate(self, attrs):
-        request = self.context['request']
-        if request.method == 'GET':
-            if request.user == attrs['author']:
-                raise serializers.ValidationError(
-                    'Невозможно подписаться на себя'
-                )
-            if Subscribe.objects.filter(
-                user=request.user,
-                author=attrs['author']
-            ).exists():
-                raise serializers.ValidationError('Вы уже подписаны')
+        # Повторы в списке не меняют результат
+        attrs = {key: list(dict.fromkeys(ids)) for key, ids in attrs.items()}
+        if set(attrs['add']) & set(attrs['remove']):
+            raise serializers.ValidationError(
+                'Один и тот же id нельзя одновременно добавить и удалить'
+            )
 
         return attrs
-
-    def to_representation(self, instance):
-
-        return SubscribersSerializer(
-            instance.author,
-            context={'request': self.context.get('request')}
-        ).data
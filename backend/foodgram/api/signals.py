@@ -0,0 +1,32 @@
+from functools import partial
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from users.models import User
+
+from .authentication import token_cache_key
+
+
+def forget_tokens(keys):
+    keys = [token_cache_key(key) for key in keys]
+    if keys:
+        transaction.on_commit(partial(cache.delete_many, keys))
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    forget_tokens([instance.key])
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, created, update_fields, **kwargs):
+    # Вход по токену сохраняет только last_login, это кэш не меняет
+    if created or (update_fields and set(update_fields) <= {'last_login'}):
+        return
+    forget_tokens(Token.objects.filter(user=instance).values_list(
+        'key', flat=True
+    ))
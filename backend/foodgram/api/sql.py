@@ -0,0 +1,63 @@
+"""
+Запись связей одним запросом в обход сигналов (recipes.signals).
+INSERT ... ON CONFLICT DO NOTHING и DELETE с RETURNING сразу
+возвращают строки, которые действительно добавлены или удалены,
+поэтому повтор запроса не меняет счетчики и суммы корзины второй раз.
+Синтаксис поддерживают PostgreSQL и SQLite 3.35+
+"""
+from django.db import connections, router
+
+
+def insert_ignore(objs, returning):
+    """
+    Вставляет объекты одной модели, пропуская те, что нарушают
+    уникальное ограничение. Возвращает значения поля returning
+    у добавленных строк
+    """
+    if not objs:
+        return []
+    model = type(objs[0])
+    opts = model._meta
+    connection = connections[router.db_for_write(model)]
+    quote = connection.ops.quote_name
+    fields = [
+        field for field in opts.local_concrete_fields
+        if field is not opts.auto_field
+    ]
+    row = f'({", ".join(["%s"] * len(fields))})'
+    params = [
+        field.get_db_prep_save(field.pre_save(obj, True), connection)
+        for obj in objs for field in fields
+    ]
+    statement = (
+        f'INSERT INTO {quote(opts.db_table)} '
+        f'({", ".join(quote(field.column) for field in fields)}) '
+        f'VALUES {", ".join([row] * len(objs))} '
+        f'ON CONFLICT DO NOTHING '
+        f'RETURNING {quote(opts.get_field(returning).column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+
+        return [value for value, in cursor.fetchall()]
+
+
+def delete_returning(queryset, returning='pk'):
+    """
+    Удаляет строки queryset одним запросом и возвращает значения
+    поля returning у удаленных строк
+    """
+    opts = queryset.model._meta
+    connection = connections[router.db_for_write(queryset.model)]
+    quote = connection.ops.quote_name
+    field = opts.pk if returning == 'pk' else opts.get_field(returning)
+    select, params = queryset.values('pk').query.sql_with_params()
+    statement = (
+        f'DELETE FROM {quote(opts.db_table)} '
+        f'WHERE {quote(opts.pk.column)} IN ({select}) '
+        f'RETURNING {quote(field.column)}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(statement, params)
+
+        return [value for value, in cursor.fetchall()]
@@ -0,0 +1,859 @@
+import base64
+import json
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import (
+    DEFAULT_DB_ALIAS, connection, connections, router, transaction
+)
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from foodgram.routers import reading_from_replica, use_primary
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCartTotal,
+    ShoppingList, Tag
+)
+from users.models import Subscribe, User
+
+from .authentication import CachedTokenAuthentication, token_cache_key
+from .cache import get_stats, reset_stats, stats_keys
+
+REPLICA = 'replica_test'
+LOCMEM_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class FoodgramTestCase(TestCase):
+    """Автор рецептов и пользователь, кэш очищается перед каждым тестом"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            password='password', first_name='Автор', last_name='Авторов'
+        )
+        cls.user = User.objects.create_user(
+            email='user@example.com', username='user',
+            password='password', first_name='Имя', last_name='Фамилия'
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=(
+            f'Token {Token.objects.get_or_create(user=user)[0].key}'
+        ))
+
+        return client
+
+
+class RecipeQueryCountTest(FoodgramTestCase):
+    """Число запросов списка и рецепта не зависит от размера страницы"""
+    recipes = 25
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        tags = [
+            Tag.objects.create(name=f'Тег {number}', color='#FFFFFF',
+                               slug=f'tag{number}')
+            for number in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(5)
+        ]
+        for number in range(cls.recipes):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}',
+                text='Описание', cooking_time=10
+            )
+            recipe.tags.set(tags[:2])
+            RecipeIngredient.objects.bulk_create([
+                RecipeIngredient(
+                    recipe=recipe, ingredient=ingredient, amount=number + 1
+                )
+                for ingredient in ingredients[:3]
+            ])
+            if number % 2 == 0:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+                ShoppingList.objects.create(user=cls.user, recipe=recipe)
+        cls.recipe = recipe
+
+    def setUp(self):
+        super().setUp()
+        self.anonymous = APIClient()
+        self.authorized = self.client_for(self.user)
+
+    def assert_queries(self, client, url, expected):
+        with self.assertNumQueries(expected):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        return response
+
+    def test_list_anonymous(self):
+        for limit in (1, 20):
+            cache.clear()
+            with self.subTest(limit=limit):
+                response = self.assert_queries(
+                    self.anonymous, f'/api/recipes/?limit={limit}', 4
+                )
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_list_authorized(self):
+        # Токен тоже кэшируется, поэтому каждый запрос начинает с промаха
+        for limit in (1, 20):
+            cache.clear()
+            with self.subTest(limit=limit):
+                response = self.assert_queries(
+                    self.authorized, f'/api/recipes/?limit={limit}', 6
+                )
+                self.assertEqual(len(response.json()['results']), limit)
+
+    def test_retrieve_anonymous(self):
+        self.assert_queries(
+            self.anonymous, f'/api/recipes/{self.recipe.id}/', 3
+        )
+
+    def test_retrieve_authorized(self):
+        response = self.assert_queries(
+            self.authorized, f'/api/recipes/{self.recipe.id}/', 5
+        )
+        self.assertTrue(response.json()['is_favorited'])
+        self.assertTrue(response.json()['is_in_shopping_cart'])
+
+
+class RecipeCacheInvalidationTest(FoodgramTestCase):
+    """Изменения рецепта сбрасывают кэш анонимных ответов"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {number}', color='#FFFFFF',
+                               slug=f'tag{number}')
+            for number in range(2)
+        ]
+        cls.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Пирог', text='Описание', cooking_time=10
+        )
+        cls.recipe.tags.set(cls.tags[:1])
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=100
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.anonymous = APIClient()
+        self.author_client = self.client_for(self.author)
+        self.url = f'/api/recipes/{self.recipe.id}/'
+
+    def patch(self, data):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.author_client.patch(self.url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_tags_change(self):
+        self.anonymous.get(self.url)
+        self.patch({'tags': [self.tags[1].id]})
+        response = self.anonymous.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(
+            [tag['id'] for tag in response.json()['tags']], [self.tags[1].id]
+        )
+
+    def test_amount_change(self):
+        self.anonymous.get(self.url)
+        self.patch({'ingredients': [{'id': self.ingredient.id, 'amount': 5}]})
+        response = self.anonymous.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['ingredients'][0]['amount'], 5)
+
+    @override_settings(CACHE_STATS_FLUSH_SECONDS=3600)
+    def test_stats_kept_in_process(self):
+        reset_stats('recipes')
+        for _ in range(3):
+            self.anonymous.get(self.url)
+        self.assertIsNone(cache.get(stats_keys('recipes')[0]))
+        self.assertEqual(get_stats('recipes'), (2, 1))
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class RecipeCreateTest(FoodgramTestCase):
+    """Ингредиенты проверяются одним запросом и вставляются пачкой"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#FFFFFF', slug='breakfast'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(3)
+        ]
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def post(self, ingredient_ids):
+        image = BytesIO()
+        Image.new('RGB', (1, 1)).save(image, 'PNG')
+        data = {
+            'name': 'Пирог', 'text': 'Описание', 'cooking_time': 10,
+            'tags': [self.tag.id],
+            'image': 'data:image/png;base64,'
+                     + base64.b64encode(image.getvalue()).decode(),
+            'ingredients': [
+                {'id': pk, 'amount': 10} for pk in ingredient_ids
+            ],
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client_for(self.author).post(
+                '/api/recipes/', data, format='json'
+            )
+
+        return response, [query['sql'] for query in queries]
+
+    def test_unknown_ingredients_in_one_error(self):
+        missing = self.ingredients[-1].id + 1
+        response, queries = self.post(
+            [self.ingredients[0].id, missing + 1, missing]
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            response.json()['ingredients'],
+            [f'Ингредиенты не найдены: {missing}, {missing + 1}']
+        )
+        self.assertEqual(
+            len([sql for sql in queries if '"recipes_ingredient"' in sql]), 1
+        )
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_single_bulk_insert(self):
+        response, queries = self.post(
+            [ingredient.id for ingredient in self.ingredients]
+        )
+        self.assertEqual(response.status_code, 201)
+        inserts = [
+            sql for sql in queries
+            if sql.startswith('INSERT INTO "recipes_recipeingredient"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(
+            RecipeIngredient.objects.filter(
+                recipe_id=response.json()['id']
+            ).count(),
+            3
+        )
+
+
+class ShoppingCartTotalTest(FoodgramTestCase):
+    """Суммы корзины совпадают с пересчетом при любых изменениях"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'Ингредиент {number}',
+                                      measurement_unit='г')
+            for number in range(3)
+        ]
+        cls.recipes = []
+        for number in range(2):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {number}',
+                text='Описание', cooking_time=10
+            )
+            for ingredient in cls.ingredients[:2]:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=10
+                )
+            cls.recipes.append(recipe)
+
+    def assert_totals(self):
+        stored = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in
+            ShoppingCartTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            )
+        }
+        self.assertEqual(stored, ShoppingCartTotal.objects.calculate())
+
+    def test_orm_changes(self):
+        # Так же изменения вносит админка
+        recipe = self.recipes[0]
+        ShoppingList.objects.create(user=self.user, recipe=recipe)
+        self.assert_totals()
+        item = RecipeIngredient.objects.filter(recipe=recipe).first()
+        item.amount = 25
+        item.save()
+        self.assert_totals()
+        item.ingredient = self.ingredients[2]
+        item.save()
+        self.assert_totals()
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=self.ingredients[0], amount=3
+        )
+        self.assert_totals()
+        item.delete()
+        self.assert_totals()
+        ShoppingList.objects.filter(user=self.user).delete()
+        self.assert_totals()
+        self.assertFalse(ShoppingCartTotal.objects.exists())
+
+    def test_recipe_delete(self):
+        for recipe in self.recipes:
+            ShoppingList.objects.create(user=self.user, recipe=recipe)
+        response = self.client_for(self.author).delete(
+            f'/api/recipes/{self.recipes[0].id}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+
+    def test_author_account_delete(self):
+        client = self.client_for(self.user)
+        for recipe in self.recipes:
+            client.post(f'/api/recipes/{recipe.id}/shopping_cart/')
+        self.assert_totals()
+        response = self.client_for(self.author).delete(
+            '/api/users/me/', {'current_password': 'password'}, format='json'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_totals()
+        self.assertFalse(ShoppingCartTotal.objects.exists())
+
+    def test_api_changes(self):
+        client = self.client_for(self.user)
+        recipe = self.recipes[0]
+        url = f'/api/recipes/{recipe.id}/shopping_cart/'
+        for method in ('post', 'post', 'delete', 'delete', 'post'):
+            getattr(client, method)(url)
+            self.assert_totals()
+        self.client_for(self.author).patch(
+            f'/api/recipes/{recipe.id}/',
+            {'ingredients': [{'id': self.ingredients[2].id, 'amount': 7}]},
+            format='json'
+        )
+        self.assert_totals()
+        client.post('/api/recipes/shopping_cart/batch/', {
+            'add': [self.recipes[1].id], 'remove': [recipe.id]
+        }, format='json')
+        self.assert_totals()
+
+
+class CountersTest(FoodgramTestCase):
+    """Счетчики на строках не расходятся с числом связанных записей"""
+
+    def setUp(self):
+        super().setUp()
+        # Рецепт создан через ORM, как это делает админка
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Пирог', text='Описание', cooking_time=10
+        )
+
+    def assert_counters(self, recipes_count, favorites_count, cart_count,
+                        followers_count):
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, recipes_count)
+        self.assertEqual(self.author.followers_count, followers_count)
+        if Recipe.objects.filter(pk=self.recipe.pk).exists():
+            self.recipe.refresh_from_db()
+            self.assertEqual(self.recipe.favorites_count, favorites_count)
+            self.assertEqual(self.recipe.shopping_cart_count, cart_count)
+
+    def test_orm_changes(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingList.objects.create(user=self.user, recipe=self.recipe)
+        Subscribe.objects.create(user=self.user, author=self.author)
+        self.assert_counters(1, 1, 1, 1)
+        Favorite.objects.all().delete()
+        ShoppingList.objects.all().delete()
+        Subscribe.objects.all().delete()
+        self.assert_counters(1, 0, 0, 0)
+
+    def test_api_delete_after_orm_create(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingList.objects.create(user=self.user, recipe=self.recipe)
+        Subscribe.objects.create(user=self.user, author=self.author)
+        client = self.client_for(self.user)
+        for url in (
+            f'/api/recipes/{self.recipe.id}/favorite/',
+            f'/api/recipes/{self.recipe.id}/shopping_cart/',
+            f'/api/users/{self.author.id}/subscribe/',
+        ):
+            self.assertEqual(client.delete(url).status_code, 204)
+        self.assert_counters(1, 0, 0, 0)
+        response = self.client_for(self.author).delete(
+            f'/api/recipes/{self.recipe.id}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_counters(0, 0, 0, 0)
+
+    def test_decrement_stops_at_zero(self):
+        # Строки без сигналов: счетчики остались нулевыми
+        Favorite.objects.bulk_create(
+            [Favorite(user=self.user, recipe=self.recipe)]
+        )
+        User.objects.filter(pk=self.author.pk).update(recipes_count=0)
+        response = self.client_for(self.user).delete(
+            f'/api/recipes/{self.recipe.id}/favorite/'
+        )
+        self.assertEqual(response.status_code, 204)
+        response = self.client_for(self.author).delete(
+            f'/api/recipes/{self.recipe.id}/'
+        )
+        self.assertEqual(response.status_code, 204)
+        self.assert_counters(0, 0, 0, 0)
+
+    def test_cascade(self):
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Subscribe.objects.create(user=self.user, author=self.author)
+        self.assert_counters(1, 1, 0, 1)
+        self.user.delete()
+        self.assert_counters(1, 0, 0, 0)
+
+
+class ToggleTest(FoodgramTestCase):
+    """Повтор добавления и удаления не меняет счетчики и суммы корзины"""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Пирог', text='Описание', cooking_time=10
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=100
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.user)
+
+    def state(self):
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+
+        return (
+            self.recipe.favorites_count,
+            self.recipe.shopping_cart_count,
+            self.author.followers_count,
+            list(ShoppingCartTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            )),
+        )
+
+    def assert_toggle(self, url, model):
+        initial = self.state()
+        self.assertEqual(self.client.post(url).status_code, 201)
+        added = self.state()
+        self.assertNotEqual(added, initial)
+        self.assertEqual(self.client.post(url).status_code, 200)
+        self.assertEqual(self.state(), added)
+        self.assertEqual(model.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.state(), initial)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.state(), initial)
+        self.assertFalse(model.objects.filter(user=self.user).exists())
+
+    def test_favorite(self):
+        self.assert_toggle(
+            f'/api/recipes/{self.recipe.id}/favorite/', Favorite
+        )
+
+    def test_shopping_cart(self):
+        self.assert_toggle(
+            f'/api/recipes/{self.recipe.id}/shopping_cart/', ShoppingList
+        )
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.client.post(f'/api/recipes/{self.recipe.id}/shopping_cart/')
+        self.assertEqual(
+            ShoppingCartTotal.objects.get(user=self.user).total_amount, 100
+        )
+
+    def test_subscribe(self):
+        self.assert_toggle(
+            f'/api/users/{self.author.id}/subscribe/', Subscribe
+        )
+
+    def test_batch_retry(self):
+        other = Recipe.objects.create(
+            author=self.author, name='Торт', text='Описание', cooking_time=10
+        )
+        url = '/api/recipes/shopping_cart/batch/'
+        missing = other.id + 1
+        data = {'add': [self.recipe.id, other.id, missing], 'remove': []}
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [item['status'] for item in response.json()['add']],
+            ['created', 'created', 'not_found']
+        )
+        added = self.state()
+        response = self.client.post(url, data, format='json')
+        self.assertEqual(
+            [item['status'] for item in response.json()['add']],
+            ['exists', 'exists', 'not_found']
+        )
+        self.assertEqual(self.state(), added)
+        data = {'add': [], 'remove': [self.recipe.id, missing]}
+        for expected in ('deleted', 'not_found'):
+            response = self.client.post(url, data, format='json')
+            self.assertEqual(response.json()['remove'][0]['status'], expected)
+        self.state()
+        self.assertEqual(self.recipe.shopping_cart_count, 0)
+        self.assertFalse(ShoppingCartTotal.objects.exists())
+
+    def test_missing_target(self):
+        self.assertEqual(
+            self.client.post('/api/recipes/0/favorite/').status_code, 404
+        )
+        self.assertEqual(
+            self.client.delete('/api/recipes/0/favorite/').status_code, 204
+        )
+
+
+class TokenCacheTest(FoodgramTestCase):
+    """Кэш токенов отвечает без запросов и сбрасывается вместе с доступом"""
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.user)
+        self.key = Token.objects.get(user=self.user).key
+
+    def me(self):
+        return self.client.get('/api/users/me/').status_code
+
+    def assert_forgotten(self, change):
+        self.assertEqual(self.me(), 200)
+        self.assertIsNotNone(cache.get(token_cache_key(self.key)))
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        self.assertIsNone(cache.get(token_cache_key(self.key)))
+
+    def test_hit_without_queries(self):
+        authentication = CachedTokenAuthentication()
+        authentication.authenticate_credentials(self.key)
+        with self.assertNumQueries(0):
+            user, token = authentication.authenticate_credentials(self.key)
+        self.assertEqual(user, self.user)
+        self.assertEqual(token.key, self.key)
+
+    def test_logout(self):
+        self.assert_forgotten(
+            lambda: self.client.post('/api/auth/token/logout/')
+        )
+        self.assertEqual(self.me(), 401)
+
+    def test_set_password(self):
+        self.assert_forgotten(lambda: self.client.post(
+            '/api/users/set_password/',
+            {'current_password': 'password', 'new_password': 'Nov0eSlovo!'},
+            format='json'
+        ))
+        self.assertTrue(
+            User.objects.get(pk=self.user.pk).check_password('Nov0eSlovo!')
+        )
+
+    def test_deactivate(self):
+        def deactivate():
+            self.user.is_active = False
+            self.user.save()
+
+        self.assert_forgotten(deactivate)
+        self.assertEqual(self.me(), 401)
+
+    def test_user_delete(self):
+        self.assert_forgotten(self.user.delete)
+        self.assertEqual(self.me(), 401)
+
+
+class SubscriptionsTest(FoodgramTestCase):
+    """Подписки: recipes_limit, счетчик рецептов и число запросов"""
+    url = '/api/users/subscriptions/'
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.authors = [cls.author] + [
+            User.objects.create_user(
+                email=f'author{number}@example.com',
+                username=f'author{number}', password='password',
+                first_name='Автор', last_name=f'Номер {number}'
+            )
+            for number in range(2)
+        ]
+        for count, author in zip((3, 1, 0), cls.authors):
+            for number in range(count):
+                Recipe.objects.create(
+                    author=author, name=f'Рецепт {number}',
+                    text='Описание', cooking_time=10
+                )
+            Subscribe.objects.create(user=cls.user, author=author)
+
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.user)
+
+    def recipe_counts(self, query=''):
+        response = self.client.get(f'{self.url}{query}')
+        self.assertEqual(response.status_code, 200)
+
+        return {
+            author['username']: len(author['recipes'])
+            for author in response.json()['results']
+        }
+
+    def test_recipes_limit(self):
+        everything = {'author': 3, 'author0': 1, 'author1': 0}
+        for limit, expected in (
+            ('0', {'author': 0, 'author0': 0, 'author1': 0}),
+            ('2', {'author': 2, 'author0': 1, 'author1': 0}),
+            ('10', everything),
+            ('-1', everything),
+            ('abc', everything),
+        ):
+            with self.subTest(limit=limit):
+                self.assertEqual(
+                    self.recipe_counts(f'?recipes_limit={limit}'), expected
+                )
+
+    def test_latest_recipes_first(self):
+        response = self.client.get(f'{self.url}?recipes_limit=2')
+        author = next(
+            item for item in response.json()['results']
+            if item['username'] == 'author'
+        )
+        expected = Recipe.objects.filter(author=self.author).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True)[:2]
+        self.assertEqual(
+            [recipe['id'] for recipe in author['recipes']], list(expected)
+        )
+
+    def test_recipes_count(self):
+        for author in self.client.get(self.url).json()['results']:
+            with self.subTest(author=author['username']):
+                self.assertEqual(
+                    author['recipes_count'],
+                    Recipe.objects.filter(author_id=author['id']).count()
+                )
+                self.assertTrue(author['is_subscribed'])
+
+    def test_queries(self):
+        # Токен уже в кэше: число запросов не зависит от числа авторов
+        for limit in (1, 3):
+            with self.subTest(limit=limit):
+                self.client.get(self.url)
+                with self.assertNumQueries(4):
+                    response = self.client.get(
+                        f'{self.url}?limit={limit}&recipes_limit=2'
+                    )
+                self.assertEqual(len(response.json()['results']), limit)
+
+
+class ServerTimingTest(FoodgramTestCase):
+    """Server-Timing отдается сотрудникам или всем при SERVER_TIMING"""
+    url = '/api/tags/'
+
+    def assert_header(self, client, present):
+        response = client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.has_header('Server-Timing'), present)
+        if present:
+            self.assertRegex(
+                response['Server-Timing'],
+                r'^db;dur=[\d.]+;desc="\d+ queries", serializer;dur=[\d.]+, '
+                r'view;dur=[\d.]+, total;dur=[\d.]+$'
+            )
+
+    @override_settings(SERVER_TIMING=False)
+    def test_disabled(self):
+        self.assert_header(APIClient(), False)
+        self.assert_header(self.client_for(self.user), False)
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        cache.clear()
+        self.assert_header(self.client_for(self.user), True)
+
+    @override_settings(SERVER_TIMING=True)
+    def test_enabled(self):
+        self.assert_header(APIClient(), True)
+        self.assert_header(self.client_for(self.user), True)
+
+
+class CursorPaginationTest(FoodgramTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for number in range(3):
+            Recipe.objects.create(
+                author=cls.author, name=f'Пирог {number}', text='Описание',
+                cooking_time=10
+            )
+
+    def test_cursor(self):
+        response = self.client.get('/api/recipes/?cursor=&limit=2')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertIsNotNone(response.json()['next'])
+
+    def test_malformed_cursor(self):
+        garbage = base64.urlsafe_b64encode(
+            json.dumps(['next', ['garbage', 'x']]).encode()
+        ).decode()
+        for cursor in ('zzz', garbage):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(f'/api/recipes/?cursor={cursor}')
+                self.assertEqual(response.status_code, 404)
+
+    def test_cursor_with_search(self):
+        # Сортировка по релевантности не совпадает с курсорной
+        response = self.client.get('/api/recipes/?cursor=&search=пирог')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('search', response.json())
+
+
+@override_settings(
+    CACHES=LOCMEM_CACHE, DATABASE_ROUTERS=['foodgram.routers.ReplicaRouter']
+)
+class ReplicaRoutingTest(TransactionTestCase):
+    """Чтение идет на реплику, запись и чтение после записи - в основную"""
+    # Реплика добавляется в setUpClass, после подготовки баз раннером
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # Реплика - второе подключение к той же тестовой базе, как с
+        # TEST MIRROR. Роутер пересоздается при включении override_settings
+        connections.settings[REPLICA] = connections[
+            DEFAULT_DB_ALIAS
+        ].settings_dict.copy()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(
+            email='author@example.com', username='author',
+            password='password', first_name='Автор', last_name='Авторов'
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Пирог', text='Описание', cooking_time=10
+        )
+        self.client = self.client_for(self.author)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=(
+            f'Token {Token.objects.create(user=user).key}'
+        ))
+
+        return client
+
+    def request(self, client, method, url):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, \
+                CaptureQueriesContext(connections[REPLICA]) as replica:
+            response = getattr(client, method)(url)
+        self.assertLess(response.status_code, 400)
+
+        return (
+            [query['sql'] for query in primary],
+            [query['sql'] for query in replica]
+        )
+
+    def recipe_queries(self, queries):
+        return [sql for sql in queries if '"recipes_recipe"' in sql]
+
+    def test_safe_request_reads_replica(self):
+        primary, replica = self.request(self.client, 'get', '/api/recipes/')
+        self.assertTrue(self.recipe_queries(replica))
+        self.assertFalse(self.recipe_queries(primary))
+
+    def test_write_goes_to_primary_and_sticks(self):
+        url = f'/api/recipes/{self.recipe.id}/favorite/'
+        primary, replica = self.request(self.client, 'post', url)
+        self.assertTrue(any(sql.startswith('INSERT') for sql in primary))
+        self.assertFalse(replica)
+        # Тот же клиент сразу видит свою запись, другие читают реплику
+        primary, replica = self.request(self.client, 'get', '/api/recipes/')
+        self.assertTrue(self.recipe_queries(primary))
+        self.assertFalse(replica)
+        other = self.client_for(User.objects.create_user(
+            email='user@example.com', username='user',
+            password='password', first_name='Имя', last_name='Фамилия'
+        ))
+        primary, replica = self.request(other, 'get', '/api/recipes/')
+        self.assertTrue(self.recipe_queries(replica))
+
+    def test_router(self):
+        token = reading_from_replica.set(True)
+        try:
+            self.assertEqual(router.db_for_read(Recipe), REPLICA)
+            self.assertEqual(router.db_for_write(Recipe), DEFAULT_DB_ALIAS)
+            with use_primary():
+                self.assertEqual(
+                    router.db_for_read(Recipe), DEFAULT_DB_ALIAS
+                )
+            with transaction.atomic():
+                self.assertEqual(
+                    router.db_for_read(Recipe), DEFAULT_DB_ALIAS
+                )
+        finally:
+            reading_from_replica.reset(token)
+        self.assertEqual(router.db_for_read(Recipe), DEFAULT_DB_ALIAS)
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN только в PostgreSQL')
+@override_settings(CACHES=LOCMEM_CACHE)
+class QueryPlanTest(TestCase):
+    """На заполненной базе основные запросы обходятся без Seq Scan"""
+
+    def test_query_plans(self):
+        letters = 'абвгдежзиклмнопрстуф'
+        Ingredient.objects.bulk_create([
+            Ingredient(
+                name=f'{letters[number % 20]} {number}', measurement_unit='г'
+            )
+            for number in range(2000)
+        ])
+        call_command(
+            'seed_data', '--users', '1200', '--favorites', '5',
+            '--cart', '3', '--subscriptions', '5', stdout=StringIO()
+        )
+        call_command(
+            'check_query_plans', '--threshold', '1000', stdout=StringIO()
+        )
@@ -0,0 +1,197 @@
+"""
+Добавление и удаление избранного, покупок и подписок.
+Вызываются из view (api.views). Каждая функция возвращает
+(данные ответа, код статуса).
+
+Операции идемпотентны: повторное добавление отвечает 200 без
+дубликата, повторное удаление - 204. Счетчики и суммы корзины
+меняются, только если строка действительно добавлена или удалена.
+Вставка и удаление идут одним запросом в обход сигналов (api.sql),
+поэтому счетчики и суммы обновляются здесь же.
+Пакетные варианты (batch_*) принимают списки id и возвращают
+статус каждого
+"""
+from django.db import transaction
+from rest_framework import serializers, status
+from rest_framework.generics import get_object_or_404
+
+from recipes.models import (
+    Favorite, Recipe, RecipeIngredient, ShoppingCartTotal, ShoppingList
+)
+from recipes.signals import change_counter
+from users.models import Subscribe, User
+
+from .serializers import RecipeShortSerializer, SubscribersSerializer
+from .sql import delete_returning, insert_ignore
+
+
+def created_status(created):
+    return status.HTTP_201_CREATED if created else status.HTTP_200_OK
+
+
+def recipe_data(request, recipe):
+    return RecipeShortSerializer(recipe, context={'request': request}).data
+
+
+@transaction.atomic
+def add_favorite(request, recipe_id):
+    recipe = get_object_or_404(Recipe, pk=recipe_id)
+    created = insert_ignore(
+        [Favorite(user=request.user, recipe=recipe)], 'recipe'
+    )
+    if created:
+        change_counter(Recipe, 'favorites_count', [recipe.pk], 1)
+
+    return recipe_data(request, recipe), created_status(created)
+
+
+@transaction.atomic
+def remove_favorite(request, recipe_id):
+    deleted = delete_returning(Favorite.objects.filter(
+        user=request.user, recipe_id=recipe_id
+    ))
+    if deleted:
+        change_counter(Recipe, 'favorites_count', [recipe_id], -1)
+
+    return 'Рецепт успешно удален', status.HTTP_204_NO_CONTENT
+
+
+@transaction.atomic
+def add_to_shopping_cart(request, recipe_id):
+    recipe = get_object_or_404(Recipe, pk=recipe_id)
+    created = insert_ignore(
+        [ShoppingList(user=request.user, recipe=recipe)], 'recipe'
+    )
+    if created:
+        ShoppingCartTotal.objects.add_recipe([request.user.id], recipe.pk)
+        change_counter(Recipe, 'shopping_cart_count', [recipe.pk], 1)
+
+    return recipe_data(request, recipe), created_status(created)
+
+
+@transaction.atomic
+def remove_from_shopping_cart(request, recipe_id):
+    deleted = delete_returning(ShoppingList.objects.filter(
+        user=request.user, recipe_id=recipe_id
+    ))
+    if deleted:
+        ShoppingCartTotal.objects.add_recipe(
+            [request.user.id], recipe_id, sign=-1
+        )
+        change_counter(Recipe, 'shopping_cart_count', [recipe_id], -1)
+
+    return (
+        'Рецепт успешно удален из списка покупок',
+        status.HTTP_204_NO_CONTENT
+    )
+
+
+@transaction.atomic
+def subscribe(request, author_id):
+    author = get_object_or_404(User, pk=author_id)
+    if author == request.user:
+        raise serializers.ValidationError('Невозможно подписаться на себя')
+    created = insert_ignore(
+        [Subscribe(user=request.user, author=author)], 'author'
+    )
+    if created:
+        change_counter(User, 'followers_count', [author.pk], 1)
+    data = SubscribersSerializer(author, context={'request': request}).data
+
+    return data, created_status(created)
+
+
+@transaction.atomic
+def unsubscribe(request, author_id):
+    deleted = delete_returning(Subscribe.objects.filter(
+        user=request.user, author_id=author_id
+    ))
+    if deleted:
+        change_counter(User, 'followers_count', [author_id], -1)
+
+    return 'Подписка успешно удалена', status.HTTP_204_NO_CONTENT
+
+
+def apply_batch(user, model, field, targets, add_ids, remove_ids):
+    """
+    Добавляет и удаляет связи пользователя с объектами field пачкой:
+    один запрос на поиск объектов, по одному на вставку и удаление.
+    Добавленные и удаленные строки берутся из RETURNING самих запросов,
+    поэтому параллельный запрос того же пользователя не посчитается
+    дважды. targets - объекты, которые можно добавить.
+    Возвращает (добавленные id, удаленные id, статусы по каждому id)
+    """
+    column = f'{field}_id'
+    found = set(
+        targets.filter(pk__in=add_ids).values_list('pk', flat=True)
+    ) if add_ids else set()
+    created = insert_ignore(
+        [model(user=user, **{column: pk}) for pk in add_ids if pk in found],
+        field
+    )
+    deleted = delete_returning(
+        model.objects.filter(user=user, **{f'{column}__in': remove_ids}),
+        field
+    ) if remove_ids else []
+
+    return created, deleted, {
+        'add': [
+            {'id': pk, 'status': (
+                'created' if pk in created else 'exists'
+            ) if pk in found else 'not_found'}
+            for pk in add_ids
+        ],
+        'remove': [
+            {'id': pk, 'status': 'deleted' if pk in deleted else 'not_found'}
+            for pk in remove_ids
+        ],
+    }
+
+
+@transaction.atomic
+def batch_favorite(request, add, remove):
+    created, deleted, statuses = apply_batch(
+        request.user, Favorite, 'recipe', Recipe.objects.all(), add, remove
+    )
+    change_counter(Recipe, 'favorites_count', created, 1)
+    change_counter(Recipe, 'favorites_count', deleted, -1)
+
+    return statuses, status.HTTP_200_OK
+
+
+@transaction.atomic
+def batch_shopping_cart(request, add, remove):
+    created, deleted, statuses = apply_batch(
+        request.user, ShoppingList, 'recipe', Recipe.objects.all(),
+        add, remove
+    )
+    change_counter(Recipe, 'shopping_cart_count', created, 1)
+    change_counter(Recipe, 'shopping_cart_count', deleted, -1)
+    if created or deleted:
+        # Суммы корзины меняются один раз на разность добавленного
+        # и удаленного
+        created = set(created)
+        amounts = {}
+        for recipe_id, ingredient_id, amount in (
+            RecipeIngredient.objects.filter(
+                recipe_id__in=[*created, *deleted]
+            ).values_list('recipe_id', 'ingredient_id', 'amount')
+        ):
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + (
+                amount if recipe_id in created else -amount
+            )
+        ShoppingCartTotal.objects.apply([request.user.id], amounts)
+
+    return statuses, status.HTTP_200_OK
+
+
+@transaction.atomic
+def batch_subscribe(request, add, remove):
+    created, deleted, statuses = apply_batch(
+        request.user, Subscribe, 'author',
+        User.objects.exclude(pk=request.user.pk), add, remove
+    )
+    change_counter(User, 'followers_count', created, 1)
+    change_counter(User, 'followers_count', deleted, -1)
+
+    return statuses, status.HTTP_200_OK
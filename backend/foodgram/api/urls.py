@@ -1,8 +1,9 @@
 from django.urls import include, path
 from rest_framework import routers
 
+from . import toggles
 from .views import (
-    DownloadShoppingCart, FavoriteViewSet, IngredientViewSet,
+    BatchView, DownloadShoppingCart, FavoriteViewSet, IngredientViewSet,
     RecipeViewSet, ShoppingListViewSet, SubscribeViewSet,
     TagViewSet
 )
@@ -15,12 +16,21 @@ router.register(r'ingredients', IngredientViewSet)
 urlpatterns = [
     path('users/subscriptions/',
          SubscribeViewSet.as_view(), name='users_subs'),
+    path('users/subscribe/batch/',
+         BatchView.as_view(batch=toggles.batch_subscribe),
+         name='subscribe_batch'),
     path('users/<int:author_id>/subscribe/',
          SubscribeViewSet.as_view(), name='subscribe'),
     path('recipes/<int:recipe_id>/favorite/',
          FavoriteViewSet.as_view(), name='add_recipe_to_favorite'),
     path('recipes/<int:recipe_id>/shopping_cart/',
          ShoppingListViewSet.as_view(), name='shopping_cart'),
+    path('recipes/favorite/batch/',
+         BatchView.as_view(batch=toggles.batch_favorite),
+         name='favorite_batch'),
+    path('recipes/shopping_cart/batch/',
+         BatchView.as_view(batch=toggles.batch_shopping_cart),
+         name='shopping_cart_batch'),
     path('recipes/download_shopping_cart/',
          DownloadShoppingCart.as_view(), name='download_shopping_cart'),
     path('', include(router.urls)),
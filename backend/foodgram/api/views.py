@@ -1,31 +1,38 @@
-from django.http import HttpResponse
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import StreamingHttpResponse
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status, viewsets
-from rest_framework.generics import get_object_or_404
-from rest_framework.pagination import PageNumberPagination
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .constants import OBJECTS_ON_THE_PAGE
-from users.models import User
-from .filters import RecipeFilter, SearchFilter
+from recipes.ingredient_index import ingredient_index
 from recipes.models import (
-    Favorite, Ingredient, Recipe,
-    ShoppingList, Tag
+    Ingredient, Recipe, RecipeIngredient, ShoppingCartTotal, Tag
 )
-from users.models import Subscribe
-from .paginators import PageNumberPaginatorModified
+from users.models import User
+
+from . import toggles
+from .constants import INGREDIENT_SEARCH_LIMIT
+from .filters import RecipeFilter
+from .mixins import AnonymousCacheMixin, ReferenceDataMixin
+from .paginators import PageNumberPaginatorModified, SubscriptionsPaginator
 from .permissions import AuthorOrReadOnly
+from .renderers import (
+    ShoppingCartCSVRenderer, ShoppingCartJSONRenderer,
+    ShoppingCartTextRenderer
+)
 from .serializers import (
-    FavoriteSerializer, IngredientSerializer,
-    RecipeCreateSerializer, RecipeListSerializer,
-    ShoppingListSerializer, SubscribersSerializer,
-    SubscribeSerializer, TagSerializer
+    BatchSerializer, IngredientSerializer, RecipeCreateSerializer,
+    RecipeListSerializer, RecipeShortSerializer, SubscribersSerializer,
+    TagSerializer
 )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, viewsets.ModelViewSet):
+    cache_name = 'recipes'
+    list_versions = ('recipes',)
+    detail_versions = ('recipe:{pk}', 'tags', 'ingredients')
     queryset = Recipe.objects.all()
     serializer_class = RecipeCreateSerializer
     permission_classes = (AuthorOrReadOnly,)
@@ -33,143 +40,153 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filterset_class = RecipeFilter
     pagination_class = PageNumberPaginatorModified
 
+    def get_queryset(self):
+        return Recipe.objects.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredient_set',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        ).with_user_flags(self.request.user)
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def perform_destroy(self, instance):
+        # Счетчики и суммы корзины покупателей поправят сигналы
+        # (recipes.signals)
+        instance.delete()
+
     def get_serializer_class(self):
         if self.action in ['list', 'retrieve']:
             return RecipeListSerializer
         return RecipeCreateSerializer
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
+    version_name = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ReferenceDataMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    С параметром ?name= работает как автодополнение по индексу
+    в памяти: сначала совпадения по началу названия, не более ?limit=
+    """
+    version_name = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
-    filter_backends = (SearchFilter,)
-    search_fields = ('name',)
+    filter_backends = ()
+
+    def render_list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().render_list(request, *args, **kwargs)
+        try:
+            limit = int(request.query_params.get('limit'))
+        except (TypeError, ValueError):
+            limit = INGREDIENT_SEARCH_LIMIT
+        limit = min(max(limit, 1), INGREDIENT_SEARCH_LIMIT)
+
+        return Response(ingredient_index.search(name, limit))
 
 
 class FavoriteViewSet(APIView):
     def post(self, request, recipe_id):
-        data = {
-            'user': request.user.id,
-            'recipe': recipe_id
-        }
-        serializer = FavoriteSerializer(
-            data=data, context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(
-            serializer.data,
-            status=status.HTTP_201_CREATED
-        )
+        return Response(*toggles.add_favorite(request, recipe_id))
 
     def delete(self, request, recipe_id):
-        favorite = get_object_or_404(
-            Favorite, user=request.user,
-            recipe__id=recipe_id
-        )
-        favorite.delete()
-        return Response(
-            'Рецепт успешно удален',
-            status=status.HTTP_204_NO_CONTENT
-        )
+        return Response(*toggles.remove_favorite(request, recipe_id))
 
 
 class SubscribeViewSet(APIView):
     def post(self, request, author_id=None):
         if author_id:
-            data = {
-                'user': request.user.id,
-                'author': author_id
-            }
-            serializer = SubscribeSerializer(
-                data=data, context={'request': request}
-            )
-            serializer.is_valid(raise_exception=True)
-            serializer.save()
-            return Response(serializer.data, status.HTTP_201_CREATED)
+            return Response(*toggles.subscribe(request, author_id))
         return None
 
     def get(self, request, author_id=None):
         user_obj = User.objects.filter(following__user=request.user)
-        paginator = PageNumberPagination()
-        paginator.page_size = OBJECTS_ON_THE_PAGE
+        paginator = SubscriptionsPaginator()
         result_page = paginator.paginate_queryset(user_obj, request)
+        prefetch_related_objects(result_page, Prefetch(
+            'recipes',
+            queryset=Recipe.objects.latest_per_author(
+                [author.id for author in result_page],
+                SubscribersSerializer.get_recipes_limit(request)
+            ).only('id', 'author', *RecipeShortSerializer.Meta.fields),
+            to_attr='recent_recipes'
+        ))
         serializer = SubscribersSerializer(
-            result_page, many=True, context={'current_user': request.user})
+            result_page, many=True, context={'request': request})
         return paginator.get_paginated_response(serializer.data)
 
     def delete(self, request, author_id=None):
         if author_id:
-            subscribe = get_object_or_404(
-                Subscribe, user=request.user,
-                author__id=author_id
-            )
-            subscribe.delete()
-            return Response(
-                'Подписка успешно удалена',
-                status=status.HTTP_204_NO_CONTENT
-            )
+            return Response(*toggles.unsubscribe(request, author_id))
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
 class ShoppingListViewSet(APIView):
     def post(self, request, recipe_id):
-        data = {
-            'user': request.user.id,
-            'recipe': recipe_id
-        }
-        serializer = ShoppingListSerializer(
-            data=data,
-            context={'request': request}
-        )
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(*toggles.add_to_shopping_cart(request, recipe_id))
 
     def delete(self, request, recipe_id):
-        shopping_list = get_object_or_404(
-            ShoppingList, user=request.user,
-            recipe__id=recipe_id
-        )
-        shopping_list.delete()
         return Response(
-            'Рецепт успешно удален из списка покупок',
-            status=status.HTTP_204_NO_CONTENT
+            *toggles.remove_from_shopping_cart(request, recipe_id)
         )
 
 
+class BatchView(APIView):
+    """
+    POST {"add": [id, ...], "remove": [id, ...]} применяет все изменения
+    одной транзакцией и возвращает статус по каждому id.
+    Функция из api.toggles передается в as_view(batch=...)
+    """
+    batch = None
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        return Response(*self.batch(request, **serializer.validated_data))
+
+
 class DownloadShoppingCart(APIView):
+    """
+    Отдает суммарный список ингредиентов из корзины покупок.
+    Формат выбирается параметром ?format=txt|csv|json
+    """
+    renderer_classes = (
+        ShoppingCartTextRenderer, ShoppingCartCSVRenderer,
+        ShoppingCartJSONRenderer,
+    )
+
     def get(self, request):
-        shopping_cart = request.user.purchases.all()
-        shopping_list = {}
-        for purchase in shopping_cart:
-            ingredients = purchase.recipe.recipeingredient_set.all()
-            for ingredient in ingredients:
-                name = ingredient.ingredient.name
-                amount = ingredient.amount
-                unit = ingredient.ingredient.measurement_unit
-                if name not in shopping_list:
-                    shopping_list[name] = {
-                        'amount': amount,
-                        'unit': unit
-                    }
-                else:
-                    shopping_list[name]['amount'] = (shopping_list[name]
-                                                     ['amount'] + amount)
-        export = []
-        for item in shopping_list:
-            export.append(f'{item} ({shopping_list[item]["unit"]}) — '
-                          f'{shopping_list[item]["amount"]} \n')
-        response = HttpResponse(export, 'Content-Type: text/plain')
-        response['Content-Disposition'] = 'attachment; filename="cart.txt"'
+        ingredients = ShoppingCartTotal.objects.filter(
+            user=request.user
+        ).values(
+            'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit', 'total_amount'
+        ).order_by('ingredient__name')
+        rows = (
+            {
+                'id': item['ingredient_id'],
+                'name': item['ingredient__name'],
+                'measurement_unit': item['ingredient__measurement_unit'],
+                'amount': item['total_amount'],
+            }
+            for item in ingredients.iterator()
+        )
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.stream(rows),
+            content_type=f'{renderer.media_type}; charset={renderer.charset}'
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="{renderer.filename}"'
+        )
         return response
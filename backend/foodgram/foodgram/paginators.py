@@ -0,0 +1,41 @@
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    На Postgres для больших выборок без фильтров берет оценку числа
+    строк из плана запроса вместо COUNT(*). Для отфильтрованных выборок
+    оценка может ошибаться на порядки, и ссылки на страницы вели бы
+    в пустоту, поэтому там считается COUNT(*)
+    """
+    @cached_property
+    def count(self):
+        estimate = self.estimate_count()
+        if (estimate is not None
+                and estimate > settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD):
+
+            return estimate
+
+        return super().count
+
+    def estimate_count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet) or queryset.query.where:
+            return None
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return None
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        return int(plan[0]['Plan']['Plan Rows'])
@@ -0,0 +1,53 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Можно ли текущему запросу читать с реплики. Выставляется
+# ReplicaRoutingMiddleware, вне запросов все идет в основную базу
+reading_from_replica = ContextVar('reading_from_replica', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in connections if alias != DEFAULT_DB_ALIAS]
+
+
+@contextmanager
+def use_primary():
+    """
+    Читать из основной базы внутри блока. Нужно там, где результат
+    кэшируется под новой версией данных и отставшая реплика
+    закэшировала бы устаревший ответ
+    """
+    token = reading_from_replica.set(False)
+    try:
+        yield
+    finally:
+        reading_from_replica.reset(token)
+
+
+class ReplicaRouter:
+    """
+    Чтение в безопасных запросах идет на случайную реплику, запись
+    и чтение внутри транзакций - в основную базу. Связанные объекты
+    читаются из той же базы, что и объект, через который к ним пришли
+    """
+    def __init__(self):
+        self.replicas = replica_aliases()
+
+    def db_for_read(self, model, **hints):
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if (not self.replicas or not reading_from_replica.get()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+
+        return random.choice(self.replicas)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
@@ -1,51 +1,69 @@
 from django.contrib import admin
 
+from foodgram.paginators import EstimatedCountPaginator
+
 from .models import (
     Favorite, Ingredient, Recipe,
     RecipeIngredient, ShoppingList, Tag
 )
 
 
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Общие настройки для больших таблиц: оценка числа строк
+    вместо COUNT(*) и без подсчета полного размера таблицы
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 class TagAdmin(admin.ModelAdmin):
     """Добавляет в панель администратора модель Tag"""
     list_display = ("name", "color", "slug")
     search_fields = ('name', 'slug',)
 
 
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(LargeTableAdmin):
     """Добавляет в панель администратора модель Ingredient"""
     list_display = ('name', 'measurement_unit')
-    list_filter = ('name',)
+    search_fields = ('^name',)
+    ordering = ('name',)
 
 
 class IngredientInLine(admin.StackedInline):
     """Добавляет наборы ингредиентов для рецепта"""
     model = RecipeIngredient
     extra = 0
+    autocomplete_fields = ('ingredient',)
 
 
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdmin):
     """Добавляет в панель администратора модель Recipe"""
-    list_display = ('author', 'name', 'favorite_count')
-    list_filter = ('author', 'name', 'tags')
+    list_display = (
+        'author', 'name', 'favorites_count', 'shopping_cart_count'
+    )
+    list_filter = ('tags',)
+    list_select_related = ('author',)
+    search_fields = ('^name', '^author__username', '^author__email')
+    autocomplete_fields = ('author', 'tags')
+    readonly_fields = ('favorites_count', 'shopping_cart_count')
     inlines = [IngredientInLine]
 
-    def favorite_count(self, obj):
-        return Favorite.objects.filter(recipe=obj).distinct().count()
-
-    favorite_count.short_description = 'Добавлено в избранное (раз)'
-
 
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdmin):
     """Добавляет в панель администратора модель ShoppingCart"""
     list_display = ('user', 'recipe')
-    search_fields = ('user', 'recipe',)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('^user__username', '^user__email', '^recipe__name')
+    raw_id_fields = ('user', 'recipe')
 
 
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdmin):
     """Добавляет в панель администратора модель Favorite"""
     list_display = ('recipe', 'user')
-    list_filter = ('user',)
+    list_select_related = ('user', 'recipe')
+    search_fields = ('^user__username', '^user__email', '^recipe__name')
+    raw_id_fields = ('user', 'recipe')
 
 
 admin.site.register(Tag, TagAdmin)
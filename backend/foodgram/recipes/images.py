@@ -0,0 +1,135 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from PIL import Image, ImageOps
+
+from .versions import bump_version
+
+logger = logging.getLogger(__name__)
+
+# Имя варианта: (максимальная сторона, формат, расширение, параметры)
+VARIANTS = {
+    'card': (480, 'JPEG', 'jpg', {'quality': 85, 'optimize': True}),
+    'card_webp': (480, 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'detail': (1280, 'JPEG', 'jpg', {'quality': 85, 'optimize': True}),
+    'detail_webp': (1280, 'WEBP', 'webp', {'quality': 80, 'method': 4}),
+}
+# Ключ в image_variants с именем исходного файла, по которому
+# построены варианты
+SOURCE_KEY = 'source'
+VARIANTS_DIR = 'recipes/images/variants/'
+
+executor = ThreadPoolExecutor(
+    max_workers=settings.IMAGE_VARIANT_WORKERS,
+    thread_name_prefix='image-variants'
+)
+
+
+def needs_variants(recipe):
+    source = recipe.image.name if recipe.image else None
+
+    return (recipe.image_variants or {}).get(SOURCE_KEY) != source
+
+
+def render_variants(image_file):
+    """
+    Строит уменьшенные копии изображения.
+    Возвращает словарь {имя варианта: (расширение, содержимое)}
+    """
+    largest = max(size for size, *_ in VARIANTS.values())
+    with Image.open(image_file) as original:
+        # Для JPEG декодер сразу уменьшает картинку кратно 2
+        original.draft('RGB', (largest, largest))
+        original = ImageOps.exif_transpose(original)
+        original.load()
+        rendered = {}
+        for name, (size, image_format, extension, options) in (
+            VARIANTS.items()
+        ):
+            image = original.copy()
+            image.thumbnail((size, size), Image.LANCZOS)
+            if image_format == 'JPEG' and image.mode != 'RGB':
+                background = Image.new('RGB', image.size, 'white')
+                image = image.convert('RGBA')
+                background.paste(image, mask=image.getchannel('A'))
+                image = background
+            buffer = BytesIO()
+            image.save(buffer, image_format, **options)
+            rendered[name] = (extension, buffer.getvalue())
+
+    return rendered
+
+
+def generate_variants(recipe_id, force=False):
+    """
+    Строит варианты изображения рецепта и сохраняет их пути
+    в image_variants. Возвращает True, если варианты обновлены
+    """
+    from .models import Recipe
+
+    recipe = Recipe.objects.only('image', 'image_variants').filter(
+        pk=recipe_id
+    ).first()
+    if recipe is None or not (force or needs_variants(recipe)):
+        return False
+    storage = recipe.image.storage
+    variants = {}
+    if recipe.image:
+        with recipe.image.open('rb') as image_file:
+            rendered = render_variants(image_file)
+        stem = os.path.splitext(os.path.basename(recipe.image.name))[0]
+        for name, (extension, content) in rendered.items():
+            variants[name] = storage.save(
+                f'{VARIANTS_DIR}{stem}_{name}.{extension}',
+                ContentFile(content)
+            )
+        variants[SOURCE_KEY] = recipe.image.name
+    # Сохраняем, только если ни изображение, ни варианты не изменились
+    # с момента чтения. Иначе параллельный запуск уже записал свои
+    # варианты, и удалять можно только собственные файлы: старые
+    # удалит тот, кто их заменил
+    current = Recipe.objects.filter(
+        pk=recipe_id, image_variants=recipe.image_variants
+    )
+    if recipe.image:
+        current = current.filter(image=recipe.image.name)
+    else:
+        current = current.filter(Q(image='') | Q(image__isnull=True))
+    updated = current.update(image_variants=variants)
+    stale = recipe.image_variants if updated else variants
+    for name, path in stale.items():
+        if name != SOURCE_KEY:
+            storage.delete(path)
+    if updated:
+        bump_version('recipes')
+        bump_version(f'recipe:{recipe_id}')
+
+    return bool(updated)
+
+
+def run_in_background(recipe_id):
+    try:
+        generate_variants(recipe_id)
+    except Exception:
+        logger.exception(
+            'Не удалось построить варианты изображения рецепта %s', recipe_id
+        )
+    finally:
+        close_old_connections()
+
+
+def schedule_variants(recipe):
+    """
+    После фиксации транзакции ставит построение вариантов в пул
+    потоков, чтобы декодирование и сжатие не задерживали ответ
+    """
+    if needs_variants(recipe):
+        transaction.on_commit(
+            lambda: executor.submit(run_in_background, recipe.pk)
+        )
@@ -0,0 +1,77 @@
+import threading
+from bisect import bisect_left
+
+from foodgram.routers import use_primary
+
+from .versions import get_version
+
+
+def normalize(value):
+    """Приводит строку к виду для поиска: без регистра, ё -> е"""
+    return value.strip().casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+    Строится лениво и перестраивается, когда меняется
+    версия ингредиентов в кэше
+    """
+    def __init__(self):
+        self.entries = None
+        self.keys = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def build(self, version):
+        from .models import Ingredient
+
+        with use_primary():
+            entries = sorted(
+                (normalize(name), pk, name, unit)
+                for pk, name, unit in Ingredient.objects.values_list(
+                    'id', 'name', 'measurement_unit'
+                ).iterator()
+            )
+        self.entries = entries
+        self.keys = [entry[0] for entry in entries]
+        self.version = version
+
+        return entries, self.keys
+
+    def get_entries(self):
+        version, _ = get_version('ingredients')
+        with self.lock:
+            if self.entries is None or self.version != version:
+                return self.build(version)
+
+            return self.entries, self.keys
+
+    def search(self, query, limit):
+        """
+        Ищет ингредиенты по названию: сначала совпадения по началу
+        названия, затем по вхождению подстроки. Не более limit результатов
+        """
+        entries, keys = self.get_entries()
+        query = normalize(query)
+        start = bisect_left(keys, query)
+        prefix = []
+        for entry in entries[start:]:
+            if len(prefix) >= limit or not entry[0].startswith(query):
+                break
+            prefix.append(entry)
+        substring = []
+        if len(prefix) < limit:
+            for entry in entries:
+                if query in entry[0] and not entry[0].startswith(query):
+                    substring.append(entry)
+                    if len(prefix) + len(substring) >= limit:
+                        break
+
+        return [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for _, pk, name, unit in prefix + substring
+        ]
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,53 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from recipes.images import generate_variants, needs_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = (
+        'Строит уменьшенные копии изображений для рецептов, у которых '
+        'их нет или они построены по старому изображению'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить варианты для всех рецептов'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=4,
+            help='Число потоков обработки'
+        )
+
+    def build(self, recipe_id):
+        try:
+            return generate_variants(recipe_id, force=True)
+        except Exception as error:
+            self.stderr.write(f'Рецепт {recipe_id}: {error}')
+            return False
+        finally:
+            close_old_connections()
+
+    def handle(self, *args, **options):
+        recipe_ids = [
+            recipe.id for recipe in Recipe.objects.only(
+                'image', 'image_variants'
+            ).order_by('id').iterator()
+            if options['force'] or needs_variants(recipe)
+        ]
+        self.stdout.write(f'Рецептов к обработке: {len(recipe_ids)}')
+        built = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            for done, result in enumerate(
+                pool.map(self.build, recipe_ids), start=1
+            ):
+                built += result
+                if done % 100 == 0:
+                    self.stdout.write(f'Обработано {done}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: обновлено {built}, пропущено {len(recipe_ids) - built}'
+        ))
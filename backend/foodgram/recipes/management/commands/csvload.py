@@ -1,17 +1,79 @@
 import csv
+import json
+import os
+from itertools import islice
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
 
 from recipes.models import Ingredient
+from recipes.versions import bump_version
+
+DEFAULT_PATH = os.path.join(
+    settings.BASE_DIR, 'recipes', 'data', 'ingredients.csv'
+)
 
 
 class Command(BaseCommand):
-    help = 'Closes the specified poll for voting'
+    help = (
+        'Загружает ингредиенты из CSV (название, единица измерения) '
+        'или JSON (список объектов name, measurement_unit). '
+        'Уже существующие ингредиенты пропускаются'
+    )
 
-    def handle(self, *args, **options):
-        with open('recipes/data/ingredients.csv', encoding='utf-8') as file:
-            file_reader = csv.reader(file)
-            for row in file_reader:
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default=DEFAULT_PATH,
+            help='Путь к файлу с ингредиентами'
+        )
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='Формат файла, по умолчанию определяется по расширению'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Количество строк в одном запросе'
+        )
+
+    def read_csv(self, file):
+        for row in csv.reader(file):
+            if row:
                 name, unit = row
-                Ingredient.objects.get_or_create(name=name,
-                                                 measurement_unit=unit)
+                yield name, unit
+
+    def read_json(self, file):
+        for item in json.load(file):
+            yield item['name'], item['measurement_unit']
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = (
+            options['format'] or os.path.splitext(path)[1].lstrip('.').lower()
+        )
+        if file_format not in ('csv', 'json'):
+            raise CommandError(f'Неизвестный формат файла: {path}')
+        batch_size = options['batch_size']
+        before = Ingredient.objects.count()
+        total = 0
+        try:
+            with open(path, encoding='utf-8') as file:
+                rows = getattr(self, f'read_{file_format}')(file)
+                while True:
+                    batch = [
+                        Ingredient(name=name, measurement_unit=unit)
+                        for name, unit in islice(rows, batch_size)
+                    ]
+                    if not batch:
+                        break
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True
+                    )
+                    total += len(batch)
+                    self.stdout.write(f'Обработано строк: {total}')
+        except (OSError, ValueError, KeyError) as error:
+            raise CommandError(f'Не удалось загрузить {path}: {error}')
+        bump_version('ingredients')
+        inserted = Ingredient.objects.count() - before
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено: {inserted}, пропущено: {total - inserted}'
+        ))
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает с нуля суммы ингредиентов в списках покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сверить суммы, ничего не изменяя'
+        )
+
+    def handle(self, *args, **options):
+        expected = ShoppingCartTotal.objects.calculate()
+        stored = {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in
+            ShoppingCartTotal.objects.values_list(
+                'user_id', 'ingredient_id', 'total_amount'
+            ).iterator()
+        }
+        mismatched = [
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        ]
+        self.stdout.write(
+            f'Проверено сумм: {len(expected)}, расхождений: {len(mismatched)}'
+        )
+        if options['check']:
+            if mismatched:
+                raise CommandError('Суммы списков покупок не совпадают')
+            return
+
+        with transaction.atomic():
+            ShoppingCartTotal.objects.all().delete()
+            ShoppingCartTotal.objects.bulk_create(
+                [
+                    ShoppingCartTotal(
+                        user_id=user_id,
+                        ingredient_id=ingredient_id,
+                        total_amount=total
+                    )
+                    for (user_id, ingredient_id), total in expected.items()
+                ],
+                batch_size=1000
+            )
+        self.stdout.write(self.style.SUCCESS('Суммы пересчитаны'))
@@ -0,0 +1,249 @@
+import random
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingList, Tag
+)
+from recipes.versions import bump_version
+from users.models import Subscribe, User
+
+# Логин состоит только из букв, как требует валидатор User.username
+USERNAME_PREFIX = 'seed'
+SEED_PASSWORD = 'seed-password'
+TAGS = (
+    ('Завтрак', '#E26C2D', 'breakfast'),
+    ('Обед', '#49B64E', 'lunch'),
+    ('Ужин', '#8775D2', 'dinner'),
+    ('Выпечка', '#D2A875', 'baking'),
+    ('Десерт', '#D275B6', 'dessert'),
+)
+DISHES = (
+    'Суп', 'Салат', 'Пирог', 'Рагу', 'Запеканка', 'Омлет', 'Каша',
+    'Паста', 'Плов', 'Котлеты', 'Соус', 'Смузи', 'Блины', 'Гратен',
+)
+STEPS = (
+    'Нарежьте {0} и обжарьте до золотистого цвета.',
+    'Добавьте {0} и тушите на медленном огне.',
+    'Смешайте {0} с остальными ингредиентами.',
+    'Посолите, добавьте {0} и доведите до кипения.',
+    'Подавайте, украсив блюдо: {0}.',
+)
+
+
+def letters(number):
+    """Записывает число буквами: 0 -> a, 25 -> z, 26 -> ba"""
+    result = ''
+    while True:
+        number, rest = divmod(number, 26)
+        result = chr(ord('a') + rest) + result
+        if not number:
+            return result
+
+
+def chunks(items, size):
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими данными для нагрузочных тестов: '
+        'пользователи, рецепты с ингредиентами из справочника, теги, '
+        'избранное, списки покупок и подписки. Все вставляется пачками. '
+        f'Пароль пользователей: {SEED_PASSWORD}'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--users', type=int, default=1000,
+            help='Число пользователей'
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=5,
+            help='Среднее число рецептов на пользователя'
+        )
+        parser.add_argument(
+            '--ingredients', type=int, nargs=2, default=(3, 15),
+            metavar=('MIN', 'MAX'),
+            help='Число ингредиентов в рецепте'
+        )
+        parser.add_argument(
+            '--favorites', type=int, default=20,
+            help='Среднее число рецептов в избранном у пользователя'
+        )
+        parser.add_argument(
+            '--cart', type=int, default=5,
+            help='Среднее число рецептов в списке покупок'
+        )
+        parser.add_argument(
+            '--subscriptions', type=int, default=10,
+            help='Среднее число подписок у пользователя'
+        )
+        parser.add_argument(
+            '--seed', type=int, default=0,
+            help='Начальное значение генератора случайных чисел'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=5000,
+            help='Количество строк в одном запросе'
+        )
+        parser.add_argument(
+            '--clear', action='store_true',
+            help='Удалить ранее созданных синтетических пользователей'
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        seeded = User.objects.filter(username__startswith=USERNAME_PREFIX)
+        if options['clear']:
+            deleted = seeded.delete()[1].get(User._meta.label, 0)
+            self.stdout.write(f'Удалено пользователей: {deleted}')
+        elif seeded.exists():
+            raise CommandError(
+                'Синтетические данные уже есть, используйте --clear'
+            )
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        low, high = options['ingredients']
+        if len(ingredient_ids) < high:
+            raise CommandError(
+                'В справочнике мало ингредиентов, сначала выполните csvload'
+            )
+        with transaction.atomic():
+            tag_ids = self.create_tags()
+            user_ids = self.create_users(options['users'])
+            recipe_ids = self.create_recipes(
+                user_ids, options['recipes'], tag_ids, ingredient_ids,
+                low, high
+            )
+            self.create_links(
+                Favorite, 'recipe', user_ids, recipe_ids,
+                options['favorites']
+            )
+            self.create_links(
+                ShoppingList, 'recipe', user_ids, recipe_ids, options['cart']
+            )
+            self.create_links(
+                Subscribe, 'author', user_ids, user_ids,
+                options['subscriptions']
+            )
+            call_command('rebuild_counters', stdout=self.stdout)
+            call_command('rebuild_cart_totals', stdout=self.stdout)
+        for name in ('tags', 'ingredients', 'recipes'):
+            bump_version(name)
+        self.stdout.write(self.style.SUCCESS('Готово'))
+
+    def count_around(self, average):
+        return self.random.randint(0, 2 * average) if average else 0
+
+    def bulk_create(self, model, objects, **kwargs):
+        total = 0
+        for chunk in chunks(objects, self.batch_size):
+            model.objects.bulk_create(chunk, **kwargs)
+            total += len(chunk)
+        self.stdout.write(f'{model._meta.verbose_name_plural}: {total}')
+
+    def create_tags(self):
+        Tag.objects.bulk_create(
+            [
+                Tag(name=name, color=color, slug=slug)
+                for name, color, slug in TAGS
+            ],
+            ignore_conflicts=True
+        )
+
+        return list(Tag.objects.values_list('id', flat=True))
+
+    def create_users(self, count):
+        password = make_password(SEED_PASSWORD)
+        self.bulk_create(User, (
+            User(
+                username=f'{USERNAME_PREFIX}{letters(number)}',
+                email=f'{USERNAME_PREFIX}{number}@example.com',
+                first_name=f'Имя{letters(number)}',
+                last_name=f'Фамилия{letters(number)}',
+                password=password,
+            )
+            for number in range(count)
+        ))
+
+        # bulk_create на SQLite не возвращает id, поэтому читаем заново
+        return list(User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).order_by('id').values_list('id', flat=True))
+
+    def create_recipes(
+        self, user_ids, average, tag_ids, ingredient_ids, low, high
+    ):
+        ingredient_names = dict(Ingredient.objects.values_list('id', 'name'))
+        contents = []
+
+        def recipes():
+            for author_id in user_ids:
+                for _ in range(self.count_around(average)):
+                    ingredients = self.random.sample(
+                        ingredient_ids,
+                        round(self.random.triangular(
+                            low, high, min(low + 4, high)
+                        ))
+                    )
+                    names = [ingredient_names[pk] for pk in ingredients]
+                    contents.append((
+                        ingredients,
+                        self.random.sample(
+                            tag_ids, self.random.randint(1, 2)
+                        )
+                    ))
+                    yield Recipe(
+                        author_id=author_id,
+                        name=f'{self.random.choice(DISHES)}: {names[0]}',
+                        text=' '.join(
+                            self.random.choice(STEPS).format(name)
+                            for name in names
+                        ),
+                        cooking_time=round(
+                            self.random.triangular(5, 180, 30)
+                        ),
+                    )
+
+        self.bulk_create(Recipe, recipes())
+        recipe_ids = list(Recipe.objects.filter(
+            author_id__in=user_ids
+        ).order_by('id').values_list('id', flat=True))
+        self.bulk_create(RecipeIngredient, (
+            RecipeIngredient(
+                recipe_id=recipe_id,
+                ingredient_id=ingredient_id,
+                amount=self.random.randint(1, 500),
+            )
+            for recipe_id, (ingredients, _) in zip(recipe_ids, contents)
+            for ingredient_id in ingredients
+        ))
+        recipe_tag = Recipe.tags.through
+        self.bulk_create(recipe_tag, (
+            recipe_tag(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id, (_, tags) in zip(recipe_ids, contents)
+            for tag_id in tags
+        ))
+
+        return recipe_ids
+
+    def create_links(self, model, field, user_ids, target_ids, average):
+        def links():
+            for user_id in user_ids:
+                count = min(self.count_around(average), len(target_ids))
+                for target_id in self.random.sample(target_ids, count):
+                    if model is Subscribe and target_id == user_id:
+                        continue
+                    yield model(user_id=user_id, **{f'{field}_id': target_id})
+
+        self.bulk_create(model, links())
@@ -0,0 +1,74 @@
+# Generated by Django 3.2.9 on 2026-10-18 02:27
+
+from django.db import migrations, models
+
+
+def merge_duplicate_rows(apps, schema_editor):
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ShoppingList = apps.get_model('recipes', 'ShoppingList')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    Recipe = apps.get_model('recipes', 'Recipe')
+
+    duplicates = RecipeIngredient.objects.values(
+        'recipe', 'ingredient'
+    ).annotate(
+        keep=models.Min('id'), amount=models.Sum('amount'),
+        total=models.Count('id')
+    ).filter(total__gt=1)
+    for group in duplicates:
+        RecipeIngredient.objects.filter(
+            recipe=group['recipe'], ingredient=group['ingredient']
+        ).exclude(id=group['keep']).delete()
+        RecipeIngredient.objects.filter(id=group['keep']).update(
+            amount=group['amount']
+        )
+
+    duplicates = ShoppingList.objects.values('user', 'recipe').annotate(
+        keep=models.Min('id'), total=models.Count('id')
+    ).filter(total__gt=1)
+    for group in duplicates:
+        extra = group['total'] - 1
+        ShoppingList.objects.filter(
+            user=group['user'], recipe=group['recipe']
+        ).exclude(id=group['keep']).delete()
+        Recipe.objects.filter(id=group['recipe']).update(
+            shopping_cart_count=models.F('shopping_cart_count') - extra
+        )
+        for item in RecipeIngredient.objects.filter(recipe=group['recipe']):
+            ShoppingCartTotal.objects.filter(
+                user=group['user'], ingredient=item.ingredient_id
+            ).update(
+                total_amount=models.F('total_amount') - item.amount * extra
+            )
+    ShoppingCartTotal.objects.filter(total_amount__lte=0).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_rows, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_name_prefix_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-pub_date', '-id'], name='recipe_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='recipeingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglist',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='unique_shopping_list'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 3.2.9 on 2026-10-18 03:10
+
+from django.db import migrations
+
+# Колонка вычисляется самой базой при каждой записи рецепта,
+# поэтому в модели ее нет и запросы не строят вектор на лету
+ADD_SEARCH_VECTOR = """
+ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('russian', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(text, '')), 'B')
+    ) STORED;
+CREATE INDEX recipe_search_vector_idx
+    ON recipes_recipe USING GIN (search_vector);
+"""
+DROP_SEARCH_VECTOR = 'ALTER TABLE recipes_recipe DROP COLUMN search_vector;'
+
+
+def add_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(ADD_SEARCH_VECTOR)
+
+
+def drop_search_vector(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_SEARCH_VECTOR)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_vector, drop_search_vector),
+    ]
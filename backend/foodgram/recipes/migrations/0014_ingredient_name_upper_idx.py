@@ -0,0 +1,37 @@
+# Generated by Django 3.2.9 on 2026-10-18 14:05
+
+from django.db import migrations
+
+# Поиск ^name в админке на PostgreSQL превращается в
+# UPPER("name"::text) LIKE UPPER('...%'), обычный индекс по name
+# для него не подходит
+CREATE_INDEX = """
+CREATE INDEX ingredient_name_upper_idx
+    ON recipes_ingredient (UPPER(name::text) text_pattern_ops);
+"""
+DROP_INDEX = 'DROP INDEX IF EXISTS ingredient_name_upper_idx;'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0013_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='ingredient_name_prefix_idx',
+        ),
+        migrations.RunPython(create_index, drop_index),
+    ]
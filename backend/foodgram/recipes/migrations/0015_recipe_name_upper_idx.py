@@ -0,0 +1,32 @@
+# Generated by Django 3.2.9 on 2026-10-18 18:40
+
+from django.db import migrations
+
+# Поиск ^name и ^recipe__name в админке рецептов, избранного и списков
+# покупок на PostgreSQL сравнивает UPPER("name"::text) через LIKE
+CREATE_INDEX = """
+CREATE INDEX recipe_name_upper_idx
+    ON recipes_recipe (UPPER(name::text) text_pattern_ops);
+"""
+DROP_INDEX = 'DROP INDEX IF EXISTS recipe_name_upper_idx;'
+
+
+def create_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEX)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_ingredient_name_upper_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
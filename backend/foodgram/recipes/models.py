@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
 from django.core.validators import MinValueValidator
 
 from users.models import User
@@ -25,6 +27,14 @@ class Ingredient(models.Model):
     measurement_unit = models.CharField('Единица измерения', max_length=256)
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
+        # Индекс по UPPER(name) для поиска ^name в админке создает
+        # миграция 0014 (только PostgreSQL)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
 
@@ -32,6 +42,53 @@ class Ingredient(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов рецептов с флагами текущего пользователя"""
+
+    def with_user_flags(self, user):
+        if user.is_anonymous:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+            )
+
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            )),
+            is_in_shopping_cart=models.Exists(ShoppingList.objects.filter(
+                user=user, recipe=models.OuterRef('pk')
+            )),
+        )
+
+    def latest_per_author(self, author_ids, limit=None):
+        """
+        Новые рецепты авторов одним запросом, не больше limit на автора.
+        Номер рецепта у автора считает оконная функция, а отбор идет
+        во внешнем подзапросе: Django 3.2 не фильтрует по Window
+        """
+        recipes = self.filter(author_id__in=author_ids)
+        ordering = ('-pub_date', '-id')
+        if limit is None:
+            return recipes.order_by(*ordering)
+        ranked = recipes.annotate(recipe_rank=models.Window(
+            RowNumber(),
+            partition_by=[models.F('author_id')],
+            order_by=[models.F('pub_date').desc(), models.F('id').desc()],
+        )).order_by().values('id', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+
+        return recipes.filter(id__in=RawSQL(
+            f'SELECT ranked."id" FROM ({sql}) ranked '
+            f'WHERE ranked."recipe_rank" <= %s',
+            (*params, limit)
+        )).order_by(*ordering)
+
+
 class Recipe(models.Model):
     """Создает модель Рецептов"""
     author = models.ForeignKey(
@@ -61,6 +118,12 @@ class Recipe(models.Model):
         verbose_name='Изображение',
         help_text='Загрузите изображение'
     )
+    image_variants = models.JSONField(
+        'Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False
+    )
     pub_date = models.DateTimeField(
         'Дата публикации',
         auto_now_add=True
@@ -72,16 +135,46 @@ class Recipe(models.Model):
             message=('Значение должно быть более 1')
         )]
     )
+    favorites_count = models.PositiveIntegerField(
+        'Добавлено в избранное (раз)', default=0
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        'Добавлено в списки покупок (раз)', default=0
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date'], name='recipe_author_date_idx'
+            ),
+        ]
+        # Индекс по UPPER(name) для поиска ^name в админке создает
+        # миграция 0015 (только PostgreSQL)
 
     def __str__(self):
         return self.name
 
 
+class RecipeIngredientQuerySet(models.QuerySet):
+    def amounts(self):
+        """Возвращает словарь {id ингредиента: суммарное количество}"""
+        amounts = {}
+        for ingredient_id, amount in self.values_list(
+            'ingredient_id', 'amount'
+        ):
+            amounts[ingredient_id] = amounts.get(ingredient_id, 0) + amount
+
+        return amounts
+
+
 class RecipeIngredient(models.Model):
     """
     Создает модель связь рецептов и ингредиентов,
@@ -105,7 +198,15 @@ class RecipeIngredient(models.Model):
         )]
     )
 
+    objects = RecipeIngredientQuerySet.as_manager()
+
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'ingredient'],
+                name='unique_recipe_ingredient'
+            )
+        ]
         verbose_name = 'Ингредиент рецепта'
         verbose_name_plural = 'Ингредиенты рецепта'
 
@@ -163,8 +264,112 @@ class ShoppingList(models.Model):
     )
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_shopping_list'
+            )
+        ]
         verbose_name = 'Покупка'
         verbose_name_plural = 'Покупки'
 
     def __str__(self):
         return f'Пользоватеь {self.user} Купил: {self.recipe.name}'
+
+
+class ShoppingCartTotalManager(models.Manager):
+    """Поддерживает суммы ингредиентов корзины через F() выражения"""
+
+    def apply(self, user_ids, amounts, sign=1):
+        """
+        Прибавляет количества {id ингредиента: количество} к суммам
+        пользователей (sign=-1 вычитает). Обнуленные строки удаляются
+        """
+        user_ids = set(user_ids)
+        amounts = {
+            ingredient_id: amount * sign
+            for ingredient_id, amount in amounts.items() if amount
+        }
+        if not user_ids or not amounts:
+            return
+        self.bulk_create(
+            [
+                self.model(
+                    user_id=user_id,
+                    ingredient_id=ingredient_id,
+                    total_amount=0
+                )
+                for user_id in user_ids
+                for ingredient_id, amount in amounts.items() if amount > 0
+            ],
+            ignore_conflicts=True
+        )
+        totals = self.filter(
+            user_id__in=user_ids, ingredient_id__in=amounts
+        )
+        totals.update(total_amount=models.F('total_amount') + models.Case(
+            *[
+                models.When(ingredient_id=ingredient_id, then=amount)
+                for ingredient_id, amount in amounts.items()
+            ],
+            default=0,
+            output_field=models.IntegerField()
+        ))
+        totals.filter(total_amount__lte=0).delete()
+
+    def add_recipe(self, user_ids, recipe, sign=1):
+        self.apply(
+            user_ids,
+            RecipeIngredient.objects.filter(recipe=recipe).amounts(),
+            sign
+        )
+
+    def calculate(self):
+        """
+        Считает суммы с нуля по спискам покупок.
+        Возвращает словарь {(id пользователя, id ингредиента): сумма}
+        """
+        totals = RecipeIngredient.objects.filter(
+            recipe__customers__isnull=False
+        ).values_list('recipe__customers__user', 'ingredient').annotate(
+            total=models.Sum('amount')
+        ).order_by()
+
+        return {
+            (user_id, ingredient_id): total
+            for user_id, ingredient_id, total in totals.iterator()
+        }
+
+
+class ShoppingCartTotal(models.Model):
+    """
+    Создает модель суммарного количества ингредиента
+    в списке покупок пользователя
+    """
+    user = models.ForeignKey(
+        User,
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE,
+        related_name='cart_totals'
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name='Ингредиент',
+        on_delete=models.CASCADE
+    )
+    total_amount = models.IntegerField('Количество', default=0)
+
+    objects = ShoppingCartTotalManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_cart_total'
+            )
+        ]
+        verbose_name = 'Сумма списка покупок'
+        verbose_name_plural = 'Суммы списков покупок'
+
+    def __str__(self):
+        return f'{self.user}: {self.ingredient} - {self.total_amount}'
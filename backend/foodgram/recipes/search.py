@@ -0,0 +1,44 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+
+
+def search_substring(queryset, query):
+    """
+    Поиск подстроки в названии и описании без учета регистра.
+    iregex, так как LIKE в SQLite не понижает регистр кириллицы
+    """
+    pattern = re.escape(query)
+
+    return queryset.filter(Q(name__iregex=pattern) | Q(text__iregex=pattern))
+
+
+def search_recipes(queryset, query):
+    """
+    Полнотекстовый поиск рецептов по названию и описанию.
+    На PostgreSQL использует хранимую колонку search_vector
+    (см. миграцию 0012) и сортирует по релевантности,
+    на остальных базах - search_substring
+    """
+    query = query.strip()
+    if not query:
+        return queryset
+    if connections[queryset.db].vendor != 'postgresql':
+        return search_substring(queryset, query)
+    vector = f'"{queryset.model._meta.db_table}"."search_vector"'
+    tsquery = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+
+    return queryset.filter(
+        RawSQL(
+            f'{vector} @@ {tsquery}', (query,), output_field=BooleanField()
+        )
+    ).annotate(
+        search_rank=RawSQL(
+            f'ts_rank({vector}, {tsquery})', (query,),
+            output_field=FloatField()
+        )
+    ).order_by('-search_rank', '-pub_date', '-id')
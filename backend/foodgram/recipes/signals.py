@@ -0,0 +1,181 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_save
+)
+from django.dispatch import receiver
+
+from users.models import Subscribe, User
+
+from .images import schedule_variants
+from .models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCartTotal,
+    ShoppingList, Tag
+)
+from .versions import bump_version
+
+# Поля автора, которые видны в карточке рецепта
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+
+
+def bump_on_commit(*names):
+    for name in names:
+        transaction.on_commit(partial(bump_version, name))
+
+
+def change_counter(model, counter, pks, delta):
+    """Меняет счетчик у строк pks на delta, не опуская его ниже нуля"""
+    if not pks:
+        return
+    rows = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        rows = rows.filter(**{f'{counter}__gte': -delta})
+    rows.update(**{counter: F(counter) + delta})
+
+
+def customers_of(recipe_id):
+    return ShoppingList.objects.filter(recipe_id=recipe_id).values_list(
+        'user_id', flat=True
+    )
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(**kwargs):
+    bump_on_commit('tags', 'recipes')
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_on_commit('ingredients', 'recipes')
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(instance, **kwargs):
+    bump_on_commit('recipes', f'recipe:{instance.pk}')
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, reverse, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # Изменены рецепты тега: после clear их уже не узнать
+        bump_on_commit('tags', 'recipes')
+        return
+    bump_on_commit('recipes', f'recipe:{instance.pk}')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(instance, **kwargs):
+    schedule_variants(instance)
+
+
+@receiver((post_save, post_delete), sender=RecipeIngredient)
+def recipe_ingredient_changed(instance, **kwargs):
+    bump_on_commit('recipes', f'recipe:{instance.recipe_id}')
+
+
+@receiver(post_save, sender=User)
+def author_changed(instance, created, update_fields, **kwargs):
+    if created or (update_fields and not AUTHOR_FIELDS & set(update_fields)):
+        return
+    recipe_ids = instance.recipes.values_list('id', flat=True)
+    bump_on_commit('recipes', *(f'recipe:{pk}' for pk in recipe_ids))
+
+
+# Счетчики на строках рецептов и пользователей для изменений через ORM.
+# Код API вставляет и удаляет в обход сигналов и меняет их сам
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, raw, **kwargs):
+    if created and not raw:
+        change_counter(User, 'recipes_count', [instance.author_id], 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    change_counter(User, 'recipes_count', [instance.author_id], -1)
+
+
+@receiver(post_save, sender=Favorite)
+def favorite_created(instance, created, raw, **kwargs):
+    if created and not raw:
+        change_counter(Recipe, 'favorites_count', [instance.recipe_id], 1)
+
+
+@receiver(post_delete, sender=Favorite)
+def favorite_deleted(instance, **kwargs):
+    change_counter(Recipe, 'favorites_count', [instance.recipe_id], -1)
+
+
+@receiver(post_save, sender=Subscribe)
+def subscribe_created(instance, created, raw, **kwargs):
+    if created and not raw:
+        change_counter(User, 'followers_count', [instance.author_id], 1)
+
+
+@receiver(post_delete, sender=Subscribe)
+def subscribe_deleted(instance, **kwargs):
+    change_counter(User, 'followers_count', [instance.author_id], -1)
+
+
+# Суммы корзины (ShoppingCartTotal) для изменений через ORM: админка,
+# каскадное удаление рецепта или пользователя. Каждая пара (строка списка
+# покупок, ингредиент рецепта) вычитается один раз: post_delete приходит
+# сразу после удаления строк своей модели, и удаленная второй уже не
+# находит пару
+
+
+@receiver(post_save, sender=ShoppingList)
+def shopping_list_saved(instance, created, raw, **kwargs):
+    if created and not raw:
+        ShoppingCartTotal.objects.add_recipe(
+            [instance.user_id], instance.recipe_id
+        )
+        change_counter(
+            Recipe, 'shopping_cart_count', [instance.recipe_id], 1
+        )
+
+
+@receiver(post_delete, sender=ShoppingList)
+def shopping_list_deleted(instance, **kwargs):
+    ShoppingCartTotal.objects.add_recipe(
+        [instance.user_id], instance.recipe_id, sign=-1
+    )
+    change_counter(Recipe, 'shopping_cart_count', [instance.recipe_id], -1)
+
+
+@receiver(pre_save, sender=RecipeIngredient)
+def recipe_ingredient_saving(instance, raw, **kwargs):
+    # Прежние ингредиент и количество, чтобы поправить суммы на разницу
+    instance._saved_amount = None
+    if not raw and not instance._state.adding:
+        instance._saved_amount = RecipeIngredient.objects.filter(
+            pk=instance.pk
+        ).values_list('ingredient_id', 'amount').first()
+
+
+@receiver(post_save, sender=RecipeIngredient)
+def recipe_ingredient_saved(instance, raw, **kwargs):
+    if raw:
+        return
+    amounts = {instance.ingredient_id: instance.amount}
+    if getattr(instance, '_saved_amount', None):
+        ingredient_id, amount = instance._saved_amount
+        amounts[ingredient_id] = amounts.get(ingredient_id, 0) - amount
+    if any(amounts.values()):
+        ShoppingCartTotal.objects.apply(
+            customers_of(instance.recipe_id), amounts
+        )
+
+
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_deleted(instance, **kwargs):
+    ShoppingCartTotal.objects.apply(
+        customers_of(instance.recipe_id),
+        {instance.ingredient_id: instance.amount},
+        sign=-1
+    )
@@ -0,0 +1,188 @@
+import shutil
+import tempfile
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from api.constants import INGREDIENT_SEARCH_LIMIT
+from api.tests import LOCMEM_CACHE
+
+from users.models import User
+
+from . import images
+from .ingredient_index import ingredient_index
+from .models import Ingredient, Recipe
+from .search import search_recipes, search_substring
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class IngredientIndexTest(TestCase):
+    """Автодополнение ингредиентов по индексу в памяти"""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create([
+            Ingredient(name=name, measurement_unit='г')
+            for name in (
+                'Свёкла', 'Свекольный сок', 'Мёд', 'Мед гречишный',
+                'Сок яблочный', 'Яблочный уксус', 'Яблоко',
+                *(f'Соль {number}' for number in range(60)),
+            )
+        ])
+
+    def setUp(self):
+        # Пустой кэш - новая версия ингредиентов, индекс строится заново
+        cache.clear()
+
+    def names(self, query, limit=10):
+        return [item['name'] for item in ingredient_index.search(query, limit)]
+
+    def test_yo_folding(self):
+        self.assertEqual(self.names('свекла'), ['Свёкла'])
+        self.assertEqual(self.names('свёк'), ['Свёкла', 'Свекольный сок'])
+        self.assertEqual(self.names('МЁД'), ['Мёд', 'Мед гречишный'])
+
+    def test_prefix_before_substring(self):
+        self.assertEqual(
+            self.names('яблоч'), ['Яблочный уксус', 'Сок яблочный']
+        )
+        self.assertEqual(self.names('сок'), ['Сок яблочный', 'Свекольный сок'])
+
+    def test_limit(self):
+        self.assertEqual(len(self.names('соль', 5)), 5)
+        self.assertEqual(self.names('яблоч', 1), ['Яблочный уксус'])
+        for limit, expected in (
+            ('0', 1), ('3', 3), ('1000', INGREDIENT_SEARCH_LIMIT),
+            ('abc', INGREDIENT_SEARCH_LIMIT),
+        ):
+            with self.subTest(limit=limit):
+                response = self.client.get(
+                    '/api/ingredients/', {'name': 'соль', 'limit': limit}
+                )
+                self.assertEqual(len(response.json()), expected)
+
+    def test_rebuild_after_changes(self):
+        self.assertEqual(self.names('укроп'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient = Ingredient.objects.create(
+                name='Укроп', measurement_unit='г'
+            )
+        self.assertEqual(self.names('укроп'), ['Укроп'])
+        ingredient.name = 'Укроп сушеный'
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.save()
+        self.assertEqual(self.names('укроп'), ['Укроп сушеный'])
+        with self.captureOnCommitCallbacks(execute=True):
+            ingredient.delete()
+        self.assertEqual(self.names('укроп'), [])
+
+
+@override_settings(CACHES=LOCMEM_CACHE)
+class SearchTest(TestCase):
+    """Поиск рецептов по ?search="""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            email='author@example.com', username='author',
+            password='password', first_name='Автор', last_name='Авторов'
+        )
+        for name, text in (
+            ('Борщ', 'Свекла и капуста'),
+            ('Пирог', 'Тесто, яблоки. Подавать с борщом'),
+            ('Салат (летний)', 'Огурцы и помидоры'),
+        ):
+            Recipe.objects.create(
+                author=author, name=name, text=text, cooking_time=10
+            )
+
+    def names(self, recipes):
+        return sorted(recipes.values_list('name', flat=True))
+
+    def test_substring(self):
+        # Запасной поиск не зависит от базы: iregex есть и в PostgreSQL
+        recipes = Recipe.objects.all()
+        for query, expected in (
+            ('БОРЩ', ['Борщ', 'Пирог']),
+            ('свекла', ['Борщ']),
+            ('(летний)', ['Салат (летний)']),
+            ('.*', []),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(
+                    self.names(search_substring(recipes, query)), expected
+                )
+
+    def test_blank_query(self):
+        recipes = Recipe.objects.all()
+        self.assertEqual(self.names(search_recipes(recipes, '  ')), [
+            'Борщ', 'Пирог', 'Салат (летний)'
+        ])
+
+    def test_filter(self):
+        response = self.client.get(
+            '/api/recipes/', {'search': 'Капуста', 'limit': 10}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [recipe['name'] for recipe in response.json()['results']],
+            ['Борщ']
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHE, MEDIA_ROOT=tempfile.mkdtemp())
+class ImageVariantsTest(TestCase):
+    """Параллельные построения вариантов не удаляют чужие файлы"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(settings.MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        image = BytesIO()
+        Image.new('RGB', (600, 400), 'red').save(image, 'PNG')
+        self.recipe = Recipe.objects.create(
+            author=User.objects.create_user(
+                email='author@example.com', username='author',
+                password='password', first_name='Автор',
+                last_name='Авторов'
+            ),
+            name='Пирог', text='Описание', cooking_time=10,
+            image=SimpleUploadedFile('pie.png', image.getvalue())
+        )
+        images.generate_variants(self.recipe.id)
+
+    def assert_files_exist(self):
+        self.recipe.refresh_from_db()
+        storage = self.recipe.image.storage
+        for name, path in self.recipe.image_variants.items():
+            if name != images.SOURCE_KEY:
+                self.assertTrue(storage.exists(path), path)
+
+    def test_concurrent_rebuild(self):
+        self.assert_files_exist()
+        render = images.render_variants
+
+        def render_after_other_run(image_file):
+            # Пока этот запуск сжимает картинку, другой успевает
+            # заменить варианты и удалить прежние файлы
+            with mock.patch.object(images, 'render_variants', render):
+                self.assertTrue(
+                    images.generate_variants(self.recipe.id, force=True)
+                )
+
+            return render(image_file)
+
+        with mock.patch.object(
+            images, 'render_variants', side_effect=render_after_other_run
+        ):
+            self.assertFalse(
+                images.generate_variants(self.recipe.id, force=True)
+            )
+        self.assert_files_exist()
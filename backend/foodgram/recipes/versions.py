@@ -0,0 +1,37 @@
+import time
+
+from django.core.cache import cache
+
+
+def version_keys(name):
+    return f'version:{name}', f'version:{name}:modified'
+
+
+def bump_version(name):
+    """
+    Увеличивает версию набора данных name и запоминает время изменения.
+    Возвращает (версия, время изменения)
+    """
+    key, modified_key = version_keys(name)
+    modified = int(time.time())
+    # Начальное значение от текущего времени, чтобы после очистки
+    # кэша версии не повторяли уже выданные клиентам
+    cache.add(key, int(time.time() * 1000), timeout=None)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        version = int(time.time() * 1000)
+        cache.set(key, version, timeout=None)
+    cache.set(modified_key, modified, timeout=None)
+
+    return version, modified
+
+
+def get_version(name):
+    """Возвращает (версия, время изменения) набора данных name"""
+    key, modified_key = version_keys(name)
+    values = cache.get_many((key, modified_key))
+    if len(values) < 2:
+        return bump_version(name)
+
+    return values[key], values[modified_key]
@@ -1,12 +1,19 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as ContribUserAdmin
 
+from foodgram.paginators import EstimatedCountPaginator
+
 from .models import User
 
 
 class UserAdmin(ContribUserAdmin):
-    list_display = ('username', 'email', 'first_name', 'last_name', 'is_staff')
-    search_fields = ('email', 'first_name', 'last_name')
+    list_display = (
+        'username', 'email', 'first_name', 'last_name', 'is_staff',
+        'recipes_count', 'followers_count',
+    )
+    search_fields = ('^username', '^email', 'first_name', 'last_name')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 admin.site.register(User, UserAdmin)
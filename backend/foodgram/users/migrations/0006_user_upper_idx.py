@@ -0,0 +1,37 @@
+# Generated by Django 3.2.9 on 2026-10-18 14:05
+
+from django.db import migrations
+
+# Поиск ^username и ^email в админке (в том числе через author__ и
+# user__) на PostgreSQL сравнивает UPPER(колонка::text) через LIKE
+CREATE_INDEXES = """
+CREATE INDEX user_username_upper_idx
+    ON users_user (UPPER(username::text) text_pattern_ops);
+CREATE INDEX user_email_upper_idx
+    ON users_user (UPPER(email::text) text_pattern_ops);
+"""
+DROP_INDEXES = """
+DROP INDEX IF EXISTS user_username_upper_idx;
+DROP INDEX IF EXISTS user_email_upper_idx;
+"""
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(CREATE_INDEXES)
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(DROP_INDEXES)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_subscribe_author_user_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
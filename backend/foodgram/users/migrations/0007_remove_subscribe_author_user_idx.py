@@ -0,0 +1,17 @@
+# Generated by Django 3.2.9 on 2026-10-18 03:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0006_user_upper_idx'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='subscribe',
+            name='subscribe_author_user_idx',
+        ),
+    ]
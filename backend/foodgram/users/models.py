@@ -33,6 +33,8 @@ class User(AbstractUser):
             )
         ]
     )
+    recipes_count = models.PositiveIntegerField('Рецептов', default=0)
+    followers_count = models.PositiveIntegerField('Подписчиков', default=0)
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
     USERNAME_FIELD = 'email'
 
@@ -71,6 +73,8 @@ class Subscribe(models.Model):
                 name='unique_subscription'
             )
         ]
+        # Подписки пользователя находит индекс уникального ограничения
+        # (user, author), подписчиков автора - индекс внешнего ключа author
 
     def __str__(self):
         return f'{self.user} подписан на {self.author}'